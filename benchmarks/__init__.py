@@ -0,0 +1,12 @@
+#
+# Benchmarks for pkmodel, run with airspeed velocity (asv).
+#
+# To run the benchmarks of the current commit, use ``asv run``, and to
+# compare two commits on the same machine, use e.g.
+#  ``asv continuous master HEAD``.
+#
+# Results are stored per machine and commit in .asv/results, so that runs
+# of different commits can be compared with ``asv compare`` or published
+# as a report with ``asv publish``. A single suite is run with e.g.
+#  ``asv run --bench RHSSuite``.
+#
@@ -0,0 +1,21 @@
+#
+# Benchmarks of the import time of pkmodel
+#
+
+
+class ImportSuite:
+    """
+    Times importing pkmodel in a fresh interpreter.
+    """
+
+    def timeraw_import_solution(self):
+        return """
+        import pkmodel
+        pkmodel.Solution
+        """
+
+    def timeraw_import_visualisation(self):
+        return """
+        import pkmodel
+        pkmodel.Visualisation
+        """
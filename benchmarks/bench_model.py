@@ -0,0 +1,48 @@
+#
+# Benchmarks of the right hand side of Model
+#
+import numpy as np
+
+import pkmodel as pk
+
+
+def make_model(components, dose_type='iv', n=1000):
+    """
+    Returns a model with the given number of components, a linear dose over
+    n time points in [0, 1] and its dose grid.
+    """
+    model_args = {'name': 'bench', 'V_c': 1.0, 'CL': 1.0}
+    if dose_type == 'sc':
+        model_args['k_a'] = 1.0
+    peripherals = components - 1 - (dose_type == 'sc')
+    for i in range(1, peripherals + 1):
+        model_args['V_p%d' % i] = 1.0
+        model_args['Q_p%d' % i] = 1.0
+
+    t = np.linspace(0, 1, n)
+    return pk.Model(components, model_args, dose_type, 2 * t, dose_grid=t)
+
+
+class RHSSuite:
+    """
+    Times one call of the right hand side of a model against the number of
+    components.
+    """
+
+    params = ([1, 2, 5, 10, 50], ['list', 'matrix', 'generated'])
+    param_names = ['components', 'engine']
+
+    def setup(self, components, engine):
+        self.model = make_model(components)
+        self.args = self.model.make_args()
+        self.K = self.model.make_matrix(self.args)
+        self.y = np.ones(components)
+        if engine == 'list':
+            self.rhs = lambda t, y: self.model.rhs(t, y, self.args)
+        elif engine == 'matrix':
+            self.rhs = lambda t, y: self.model.rhs_matrix(t, y, self.K)
+        else:
+            self.rhs = self.model.make_generated(self.args)[0]
+
+    def time_rhs(self, components, engine):
+        self.rhs(0.5, self.y)
@@ -0,0 +1,23 @@
+#
+# Benchmarks of Protocol
+#
+import pkmodel as pk
+
+
+class InstantaneousDoseSuite:
+    """
+    Times the instantaneous dose against the number of time points, for
+    two and for many boluses.
+    """
+
+    params = ([1000, 10000, 100000], [2, 100])
+    param_names = ['n', 'boluses']
+
+    def setup(self, n, boluses):
+        self.protocol = pk.Protocol(quantity=2, t_end=1000, n=n)
+        self.times = None
+        if boluses > 2:
+            self.times = [1000 * (i + 0.5) / boluses for i in range(boluses)]
+
+    def time_instantaneous_dose(self, n, boluses):
+        self.protocol.instantaneous_dose(times=self.times)
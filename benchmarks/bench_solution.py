@@ -0,0 +1,27 @@
+#
+# Benchmarks of Solution
+#
+import numpy as np
+
+import pkmodel as pk
+
+from .bench_model import make_model
+
+
+class AnalyseModelsSuite:
+    """
+    Times solving models against the number of models and the length of
+    t_eval, without saving the solutions.
+    """
+
+    params = ([1, 10, 100], [100, 1000, 10000])
+    param_names = ['models', 'points']
+
+    def setup(self, models, points):
+        t_eval = np.linspace(0, 1, points)
+        self.solution = pk.Solution(
+            [make_model(2, n=points) for _ in range(models)], t_eval,
+            [[0.0, 0.0]] * models, sink=pk.NullSink())
+
+    def time_analyse_models(self, models, points):
+        self.solution.analyse_models()
@@ -0,0 +1,37 @@
+#
+# Benchmarks of saving solutions
+#
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import pkmodel as pk
+
+
+class SaveSuite:
+    """
+    Times saving a solution in each output format against the number of
+    time points. The throughput is the number of time points saved per
+    second.
+    """
+
+    params = ([1000, 100000], ['csv', 'binary'])
+    param_names = ['points', 'output_format']
+
+    def setup(self, points, output_format):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'solution')
+        self.time = np.linspace(0, 1, points)
+        self.sol = np.vstack([np.sin(self.time), np.cos(self.time)])
+        self.solution = pk.Solution([], self.time, [])
+
+    def teardown(self, points, output_format):
+        shutil.rmtree(self.directory)
+
+    def time_save(self, points, output_format):
+        if output_format == 'csv':
+            self.solution._save_to_csv(self.time, self.sol, self.path)
+        else:
+            self.solution._save_to_binary(self.time, self.sol, self.path)
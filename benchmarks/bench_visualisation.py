@@ -0,0 +1,53 @@
+#
+# Benchmarks of Visualisation
+#
+import os
+import shutil
+import tempfile
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+import pkmodel as pk
+from pkmodel import visualisation
+
+
+class VisualisationSuite:
+    """
+    Times loading and plotting a saved solution against the number of time
+    points, for each output format.
+    """
+
+    params = ([1000, 100000], ['csv', 'binary'])
+    param_names = ['points', 'output_format']
+
+    def setup(self, points, output_format):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'solution')
+        time = np.linspace(0, 1, points)
+        sol = np.vstack([np.sin(time), np.cos(time)])
+        solution = pk.Solution([], time, [])
+        if output_format == 'csv':
+            solution._save_to_csv(time, sol, self.path)
+        else:
+            solution._save_to_binary(time, sol, self.path)
+
+    def teardown(self, points, output_format):
+        visualisation._cache.clear()
+        plt.close('all')
+        shutil.rmtree(self.directory)
+
+    def _visualisation(self):
+        # Loading is lazy, and cached across Visualisation instances
+        visualisation._cache.clear()
+        return pk.Visualisation([self.path], ['model'], ['iv'])
+
+    def time_load(self, points, output_format):
+        self._visualisation()._quantity['model']
+
+    def time_render(self, points, output_format):
+        self._visualisation().visualise(['model'])
+        plt.close('all')
@@ -29,8 +29,8 @@ trial_protocol = pk.Protocol(quantity = 2, t_start = t_0, t_end=t_end, n = preci
 X = trial_protocol.linear_dose()
 
 # Model
-trial1 = pk.Model(2,model1_args,'iv',X)
-trial2 = pk.Model(2,model2_args,'sc',X)
+trial1 = pk.Model(2,model1_args,'iv',X,dose_grid=trial_protocol.t)
+trial2 = pk.Model(2,model2_args,'sc',X,dose_grid=trial_protocol.t)
 models = [trial1,trial2]
 
 # Solution
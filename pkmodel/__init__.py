@@ -11,4 +11,31 @@ from .version_info import VERSION_INT, VERSION  # noqa
 from .model import Model    # noqa
 from .protocol import Protocol    # noqa
 from .solution import Solution     # noqa
-from .visualisation import Visualisation     # noqa
\ No newline at end of file
+from .propagator import Propagator, PropagatorInterpolant     # noqa
+from .population import Population     # noqa
+from .storage import ColumnarWriter, read_columnar     # noqa
+from .sinks import (Sink, NullSink, MemorySink, FileSink,     # noqa
+                    BackgroundSink)
+from .cache import SolutionCache     # noqa
+from .regimen import (Regimen, Bolus, RepeatedBolus, Infusion,     # noqa
+                      CombinedRegimen, loading_dose)
+from .conditions import StopCondition, BelowThreshold, Plateau     # noqa
+from .fitting import Fit, fit_all     # noqa
+from .metrics import RunningMetrics, MetricsSink     # noqa
+
+
+# Visualisation pulls in matplotlib and pandas, so it is only imported on
+# first use. This keeps ``import pkmodel`` cheap for processes that only
+# solve models, as do the scipy submodules, which are imported where they
+# are used. Module __getattr__ requires Python 3.7 (PEP 562).
+def __getattr__(name):
+    if name in ('Visualisation', 'visualisation'):
+        import importlib
+        visualisation = importlib.import_module('.visualisation', __name__)
+        globals()['Visualisation'] = visualisation.Visualisation
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + ['Visualisation', 'visualisation'])
@@ -0,0 +1,223 @@
+#
+# Solution cache
+#
+import collections
+import hashlib
+import os
+import pickle
+import types
+
+import numpy as np
+
+
+_FUNCTION_TYPES = (types.FunctionType, types.MethodType,
+                   types.BuiltinFunctionType, type)
+
+
+def _feed(h, obj):
+    # Feeds a canonical representation of obj to the hash h, so that equal
+    # values hash the same in every process and session
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        h.update(repr((type(obj).__name__, obj)).encode())
+    elif isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        h.update(repr(('array', array.dtype.str, array.shape)).encode())
+        h.update(array.tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'dict')
+        for key in sorted(obj, key=repr):
+            _feed(h, key)
+            _feed(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(repr((type(obj).__name__, len(obj))).encode())
+        for item in obj:
+            _feed(h, item)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, _FUNCTION_TYPES):
+        # Regimens, stop conditions and similar plain objects
+        h.update(repr(('object', type(obj).__module__,
+                       type(obj).__qualname__)).encode())
+        _feed(h, vars(obj))
+    else:
+        # Fails for objects without a stable content, e.g. lambdas
+        h.update(pickle.dumps(obj, protocol=4))
+
+
+class SolutionCache:
+    """
+    A content-addressed cache of Pharmokinetic (PK) model solutions
+
+    Solutions are keyed by a hash of everything that determines them: the
+    model parameters (but not the model name), dose type, dose schedule and
+    dose grid, initial conditions, t_eval and the solver and output
+    settings of the Solution. Recently used solutions are kept in memory,
+    and every solution is also saved on disk if a directory is given, so
+    that it outlives the process. Given to Solution as cache, solutions
+    found in the cache are returned without solving the model again.
+
+    Cached solutions are returned as copies of the stored solution, sharing
+    its arrays, which should not be modified.
+
+    Parameters
+    ----------
+
+    maxsize: int, optional
+        Maximum number of solutions kept in memory. The least recently used
+        solution is evicted first.
+
+    directory: None or str or PathLike, optional
+        Directory of the on-disk tier. If None then solutions are only kept
+        in memory.
+
+    max_bytes: int, optional
+        Maximum total size of the files of the on-disk tier. The least
+        recently used files are deleted first.
+
+    Attributes
+    ----------
+
+    .memory_hits, .disk_hits, .misses: int
+        Number of lookups found in memory, found on disk and not found.
+
+    """
+
+    def __init__(self, maxsize=128, directory=None, max_bytes=2**30):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = collections.OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, y0, solution):
+        """
+        Returns the key of the solution of a model from the initial
+        conditions y0 by a Solution instance, or None if the model cannot
+        be hashed, e.g. if its dose is a lambda.
+        """
+        model_args = {key: value for key, value in model.model_args.items()
+                      if key != 'name'}
+        dose_t = model.dose_t
+        if not callable(dose_t):
+            dose_t = np.asarray(dose_t, dtype=float)
+        t_eval = np.asarray(solution.t_eval, dtype=float)
+        # Models without a dose grid are given t_eval as dose grid
+        dose_grid = model.dose_grid if model.dose_grid is not None else t_eval
+        engine = solution.engine if solution.engine is not None \
+            else model.engine
+        content = [model.components, model.dose_type, model_args, dose_t,
+                   dose_grid, np.asarray(y0, dtype=float), t_eval, engine,
+                   solution.method, solution.rtol, solution.atol,
+                   solution.max_step, solution.dose_input, solution.batch,
+                   solution.impulse_doses, solution.dense_output,
+                   solution.stop_conditions, solution.sensitivities,
+                   solution.compartments,
+                   None if solution.dtype is None else solution.dtype.str,
+                   solution.decimate]
+
+        h = hashlib.sha256()
+        try:
+            _feed(h, content)
+        except (pickle.PicklingError, TypeError, AttributeError, ValueError):
+            return None
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the solution of a key, or None if it is not cached.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._copy(self._memory[key])
+
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    sol = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                self.misses += 1
+                return None
+            # Mark the file as recently used
+            os.utime(path)
+            self.disk_hits += 1
+            self._remember(key, sol)
+            return self._copy(sol)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, sol):
+        """
+        Stores the solution of a key in memory and on disk.
+        """
+        self._remember(key, sol)
+        path = self._path(key)
+        if path is not None:
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(sol, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+            self._evict()
+
+    def clear(self):
+        """
+        Removes every solution from memory and disk.
+        """
+        self._memory.clear()
+        for entry in self._entries():
+            os.remove(entry.path)
+
+    def stats(self):
+        """
+        Returns a dict of hit and miss counts, the hit rate and the number
+        of solutions and bytes held by each tier.
+        """
+        entries = self._entries()
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {'hits': hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': len(entries),
+                'disk_bytes': sum(entry.stat().st_size for entry in entries)}
+
+    def _copy(self, sol):
+        # A new solution object sharing the arrays of the cached solution
+        return type(sol)(sol)
+
+    def _remember(self, key, sol):
+        self._memory[key] = sol
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key + '.pkl')
+
+    def _entries(self):
+        if self.directory is None:
+            return []
+        return [entry for entry in os.scandir(self.directory)
+                if entry.name.endswith('.pkl')]
+
+    def _evict(self):
+        # Deletes the least recently used files beyond max_bytes
+        entries = sorted(self._entries(),
+                         key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
@@ -0,0 +1,135 @@
+#
+# Stop condition classes
+#
+import numpy as np
+
+
+class StopCondition:
+    """
+    A condition ending the integration of a Pharmokinetic (PK) model early
+
+    A condition is given to Solution through stop_conditions. It is turned
+    into a terminal event function g(t, y) of scipy's solve_ivp for each
+    model, and integration stops when g crosses zero in the direction of
+    the condition. The solution then only holds the time points before
+    the stop, and records its stop_time and stop_reason.
+
+    Subclasses implement event_function and set reason.
+
+    Parameters
+    ----------
+
+    compartment: str or int, optional
+        'central' = the central compartment (q_c) of the model (default)
+        or the index of a compartment in the state vector.
+
+    """
+
+    reason = 'condition reached'
+    direction = -1
+
+    def __init__(self, compartment='central'):
+        self.compartment = compartment
+
+    def index(self, model):
+        # Index of the compartment of the condition in the state vector
+        if self.compartment == 'central':
+            return 1 if model.dose_type == 'sc' else 0
+        return int(self.compartment)
+
+    def event(self, model, args):
+        """
+        Returns the terminal event function of the condition for a model.
+        """
+        g = self.event_function(model, args)
+
+        def event(t, y):
+            return g(t, y)
+
+        event.terminal = True
+        event.direction = self.direction
+        return event
+
+    def event_function(self, model, args):
+        raise NotImplementedError
+
+
+class BelowThreshold(StopCondition):
+    """
+    Stops once the concentration of a compartment falls below a threshold,
+    e.g. the lower limit of quantification in a washout study.
+
+    The concentration of the central compartment is q_c / V_c; for any
+    other compartment the amount of drug is compared instead.
+
+    Parameters
+    ----------
+
+    threshold: float, required
+
+    compartment: str or int, optional
+        See StopCondition.
+
+    """
+
+    def __init__(self, threshold, compartment='central'):
+        super().__init__(compartment)
+        self.threshold = threshold
+        self.reason = 'concentration below %g' % threshold
+
+    def event_function(self, model, args):
+        i = self.index(model)
+        scale = 1.0
+        if self.compartment == 'central':
+            scale = 1.0 / model.model_args['V_c']
+
+        def g(t, y):
+            return y[i] * scale - self.threshold
+
+        return g
+
+
+class Plateau(StopCondition):
+    """
+    Stops once the relative rate of change of the drug, |dq/dt| / q, falls
+    below epsilon in every compartment, i.e. when the model reaches steady
+    state, e.g. at the end of a titration.
+
+    Every compartment is checked rather than one alone, since the rate of
+    change of a single compartment also vanishes at each of its peaks,
+    briefly enough that a solver may or may not step over it. Compartments
+    holding no drug and not changing are ignored.
+
+    Parameters
+    ----------
+
+    epsilon: float, required
+
+    compartments: None or list of int, optional
+        Indices in the state vector of the compartments checked. If None
+        (default) then every compartment is checked.
+
+    """
+
+    def __init__(self, epsilon, compartments=None):
+        super().__init__()
+        self.epsilon = epsilon
+        self.compartments = compartments
+        self.reason = 'relative change below %g' % epsilon
+
+    def event_function(self, model, args):
+        K = model.make_matrix(args)
+        n = len(K)
+        rows = (slice(None) if self.compartments is None
+                else list(self.compartments))
+        tiny = np.finfo(float).tiny
+
+        def g(t, y):
+            # y may be followed by sensitivities, see Solution
+            q = np.asarray(y[:n], dtype=float)
+            rate = K.dot(q)
+            rate[0] += model.dose(t)
+            relative = np.abs(rate[rows]) / np.maximum(np.abs(q[rows]), tiny)
+            return np.max(relative) - self.epsilon
+
+        return g
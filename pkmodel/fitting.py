@@ -0,0 +1,239 @@
+#
+# Parameter estimation
+#
+import concurrent.futures
+import copy
+
+import numpy as np
+
+from .solution import Solution
+
+
+class Fit:
+    """
+    A least-squares fit of the parameters of a Pharmokinetic (PK) model to
+    observed concentrations
+
+    The model is solved at the observation times only, with the
+    sensitivities of the amounts to its parameters (see Solution), which
+    give the Jacobian of the residuals to scipy's least_squares without
+    finite differences. One copy of the model and one Solution are built
+    and reused for every iteration, only the values of the fitted
+    parameters changing.
+
+    Parameters
+    ----------
+
+    :param model: Model class instance, required.
+        The model to fit, whose parameters not fitted are kept. The model
+        itself is not modified. A dose given at time points must have a
+        dose grid, see Model.
+
+    :param times: array_like, required.
+        Observation times.
+
+    :param observations: array_like, required.
+        Observed concentration at each observation time.
+
+    :param parameters: list of str, required.
+        Names of the fitted parameters, e.g. ['V_c', 'CL', 'Q_p1', 'k_a'],
+        see Model.parameter_names.
+
+    :param y0: list, optional.
+        Initial amount of drug in all compartments. Defaults to no drug.
+
+    :param t_start: float, optional.
+        Time of the initial conditions, at or before the first observation.
+
+    :param compartment: str or int, optional.
+        'central' = the observations are concentrations q_c / V_c of the
+        central compartment (default), or the index of the compartment
+        whose amount is observed.
+
+    :param weights: array_like, optional.
+        Weight of each residual, e.g. 1 / standard deviation.
+
+    :param log: bool, optional.
+        If True (default) then parameters are fitted on a log scale, which
+        keeps them positive.
+
+    :param solution_options: optional.
+        Keyword arguments passed to Solution, e.g. method='BDF'. Defaults
+        to rtol=1e-8 and atol=1e-10.
+
+    """
+
+    def __init__(self, model, times, observations, parameters, y0=None,
+                 t_start=0.0, compartment='central', weights=None, log=True,
+                 **solution_options):
+        times = np.asarray(times, dtype=float)
+        observations = np.asarray(observations, dtype=float)
+        if times.shape != observations.shape:
+            raise ValueError("There must be one observation per time")
+
+        names = model.parameter_names()
+        if not set(parameters).issubset(names):
+            raise ValueError("Not valid parameters. Parameters must be in %s"
+                             % names)
+
+        if (model.dose_grid is None and not callable(model.dose_t)
+                and np.size(model.dose_t) > 1):
+            raise ValueError("The dose grid of the model must be defined")
+
+        if np.any(times < t_start):
+            raise ValueError("Observations must not be before t_start")
+
+        # A copy of the model whose fitted parameters are updated in place
+        self.model = copy.copy(model)
+        self.model.model_args = dict(model.model_args)
+        self.parameters = list(parameters)
+        self.y0 = np.zeros(model.components) if y0 is None \
+            else np.asarray(y0, dtype=float)
+        self.observations = observations
+        self.weights = 1.0 if weights is None \
+            else np.asarray(weights, dtype=float)
+        self.log = log
+
+        if compartment == 'central':
+            self._index = 1 if model.dose_type == 'sc' else 0
+            self._concentration = True
+        else:
+            self._index = int(compartment)
+            self._concentration = False
+        self._columns = [names.index(name) for name in self.parameters]
+        self._V_c = names.index('V_c')
+
+        # The solution is evaluated at the observation times only
+        t_eval, self._points = np.unique(np.concatenate([[t_start], times]),
+                                         return_inverse=True)
+        self._points = self._points[1:]
+        options = {'rtol': 1e-8, 'atol': 1e-10}
+        options.update(solution_options)
+        self.solution = Solution([self.model], t_eval, [self.y0],
+                                 sensitivities=True, **options)
+        self._x = None
+
+    def x0(self):
+        """
+        Returns the current values of the fitted parameters, on a log scale
+        if log is True.
+        """
+        theta = np.array([self.model.model_args[name]
+                          for name in self.parameters], dtype=float)
+        return np.log(theta) if self.log else theta
+
+    def _evaluate(self, x):
+        # Solves the model with the parameters x, once per x
+        if self._x is not None and np.array_equal(x, self._x):
+            return
+        theta = np.exp(x) if self.log else x
+        for name, value in zip(self.parameters, theta):
+            self.model.model_args[name] = float(value)
+
+        sol = self.solution._integrate(self.model, self.model.make_args(),
+                                       self.y0)
+        if not sol.success or sol.y.shape[1] != len(self.solution.t_eval):
+            raise RuntimeError("The model could not be solved: %s"
+                               % sol.message)
+
+        q = sol.y[self._index, self._points]
+        S = sol.sensitivities[:, self._index, self._points].T
+        if self._concentration:
+            # c = q_c / V_c
+            V_c = self.model.model_args['V_c']
+            S = S / V_c
+            S[:, self._V_c] -= q / V_c**2
+            q = q / V_c
+
+        J = S[:, self._columns]
+        if self.log:
+            J = J * theta
+        self._x = np.array(x, dtype=float)
+        self._values = q
+        self._jacobian = J * np.reshape(self.weights, (-1, 1))
+
+    def residuals(self, x):
+        """
+        Returns the weighted residuals of the model with the parameters x.
+        """
+        self._evaluate(x)
+        return self.weights * (self._values - self.observations)
+
+    def jacobian(self, x):
+        """
+        Returns the Jacobian of the residuals with respect to x.
+        """
+        self._evaluate(x)
+        return self._jacobian
+
+    def run(self, x0=None, **options):
+        """
+        Fits the parameters with scipy's least_squares.
+
+        Parameters
+        ----------
+
+        x0: array_like, optional.
+            Initial parameters, on a log scale if log is True. Defaults to
+            the parameters of the model.
+
+        options: optional.
+            Keyword arguments passed to least_squares, e.g. bounds.
+
+        Returns
+        -------
+
+        :return result: the OptimizeResult of least_squares, with the fitted
+            parameters as a dict in 'parameters' and a copy of the model
+            with the fitted parameters in 'model'.
+
+        """
+        import scipy.optimize
+
+        if x0 is None:
+            x0 = self.x0()
+        result = scipy.optimize.least_squares(self.residuals, x0,
+                                              jac=self.jacobian, **options)
+        theta = np.exp(result.x) if self.log else result.x
+        result.parameters = dict(zip(self.parameters, theta.tolist()))
+        model = copy.copy(self.model)
+        model.model_args = dict(self.model.model_args, **result.parameters)
+        result.model = model
+        return result
+
+
+def _run_fit(task):
+    # Runs a fit in a worker process
+    fit, options = task
+    return fit.run(**options)
+
+
+def fit_all(fits, processes=None, **options):
+    """
+    Runs the fits of many subjects, serially or in a process pool.
+
+    Parameters
+    ----------
+
+    fits: list of Fit instances, required.
+
+    processes: None or int, optional.
+        If None (default) then fits are run serially, otherwise in a pool
+        of this many processes.
+
+    options: optional.
+        Keyword arguments passed to Fit.run.
+
+    Returns
+    -------
+
+    :return results: the result of each fit, in the order of fits.
+
+    """
+    tasks = [(fit, options) for fit in fits]
+    if processes is None:
+        return [_run_fit(task) for task in tasks]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) \
+            as executor:
+        return list(executor.map(_run_fit, tasks))
@@ -0,0 +1,249 @@
+#
+# Pharmokinetic exposure metrics
+#
+import numpy as np
+
+from .sinks import Sink
+
+
+# Metrics computed by summarise, in order
+METRICS = ['auc', 'cmax', 'tmax', 'half_life', 'time_above']
+
+
+def stack(sol_list):
+    """
+    Stacks solutions computed at the same time points into one array.
+
+    Parameters
+    ----------
+
+    sol_list: list of solution Bunch objects, required.
+        Solutions with the same time points and number of compartments,
+        e.g. as returned by Solution.analyse_models.
+
+    Returns
+    -------
+
+    :return (t, y): the time points and an array of shape (models,
+        compartments, time points).
+
+    """
+    t = np.asarray(sol_list[0].t)
+    for sol in sol_list:
+        if not np.array_equal(sol.t, t):
+            raise ValueError("The solutions must have the same time points")
+    return t, np.stack([sol.y for sol in sol_list])
+
+
+def auc(t, y):
+    """
+    Returns the area under the curve of y over t by the trapezoidal rule.
+
+    y is an array of any shape whose last axis matches t, e.g. (models,
+    compartments, time points); metrics reduce the last axis.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.sum(np.diff(t) * (y[..., 1:] + y[..., :-1]), axis=-1) / 2
+
+
+def cmax(y):
+    """
+    Returns the maximum of y over its last axis.
+    """
+    return np.max(y, axis=-1)
+
+
+def tmax(t, y):
+    """
+    Returns the first time of the maximum of y over its last axis.
+    """
+    return np.asarray(t, dtype=float)[np.argmax(y, axis=-1)]
+
+
+def half_life(t, y, points=3):
+    """
+    Returns the terminal half-life ln(2) / lambda, where lambda is the slope
+    of the least-squares line through log(y) at the last points time
+    points. The half-life is nan where y is not positive at these points or
+    is not decreasing.
+    """
+    t = np.asarray(t, dtype=float)[-points:]
+    y = np.asarray(y, dtype=float)[..., -points:]
+    positive = np.all(y > 0, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_y = np.log(np.where(y > 0, y, 1.0))
+        dt = t - t.mean()
+        slope = np.sum(dt * (log_y - log_y.mean(axis=-1, keepdims=True)),
+                       axis=-1) / np.sum(dt**2)
+        T = np.log(2) / -slope
+    return np.where(positive & (slope < 0), T, np.nan)
+
+
+def _time_above(t, y, threshold):
+    # Time above threshold within each interval, the values being linear
+    # between time points
+    h = np.diff(t)
+    a, b = y[..., :-1] - threshold, y[..., 1:] - threshold
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = np.where(a > 0, a, b) / np.abs(b - a)
+    return h * np.where((a > 0) & (b > 0), 1.0,
+                        np.where((a > 0) | (b > 0), crossing, 0.0))
+
+
+def time_above(t, y, threshold):
+    """
+    Returns the time during which y is above threshold, the values being
+    linear between time points.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.sum(_time_above(t, y, threshold), axis=-1)
+
+
+def summarise(t, y, threshold=None, points=3):
+    """
+    Returns every metric of y over t.
+
+    Parameters
+    ----------
+
+    t: array_like, required.
+        Time points.
+
+    y: array_like, required.
+        Values with the time points along the last axis, e.g. an array of
+        shape (models, compartments, time points) from stack.
+
+    threshold: None or float, optional.
+        Threshold of time_above. If None then time_above is nan.
+
+    points: int, optional.
+        Number of terminal time points of half_life.
+
+    Returns
+    -------
+
+    :return metrics: a dict of arrays keyed by the names of METRICS, each
+        of the shape of y without its last axis.
+
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    above = (time_above(t, y, threshold) if threshold is not None
+             else np.full(y.shape[:-1], np.nan))
+    return {'auc': auc(t, y),
+            'cmax': cmax(y),
+            'tmax': tmax(t, y),
+            'half_life': half_life(t, y, points),
+            'time_above': above}
+
+
+class RunningMetrics:
+    """
+    Metrics of a trajectory given in consecutive chunks of time points
+
+    Each chunk updates the metrics and is then discarded, only the last
+    few time points being kept for the half-life, so that the metrics of
+    long or many trajectories are computed in bounded memory, e.g. while
+    they are being solved or read back from a ColumnarWriter file.
+
+    Parameters
+    ----------
+
+    threshold: None or float, optional.
+        Threshold of time_above, see summarise.
+
+    points: int, optional.
+        Number of terminal time points of half_life.
+
+    """
+
+    def __init__(self, threshold=None, points=3):
+        self.threshold = threshold
+        self.points = points
+        self._t = None
+        self._y = None
+
+    def update(self, t, y):
+        """
+        Updates the metrics with the next chunk of time points t and values
+        y, with the time points along the last axis of y.
+        """
+        t = np.asarray(t, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if len(t) == 0:
+            return
+
+        if self._t is None:
+            self._auc = np.zeros(y.shape[:-1])
+            self._above = np.zeros(y.shape[:-1])
+            self._cmax = np.full(y.shape[:-1], -np.inf)
+            self._tmax = np.full(y.shape[:-1], np.nan)
+        else:
+            # Chunks are joined by the last time point of the previous one
+            t = np.concatenate([self._t[-1:], t])
+            y = np.concatenate([self._y[..., -1:], y], axis=-1)
+
+        self._auc += auc(t, y)
+        if self.threshold is not None:
+            self._above += time_above(t, y, self.threshold)
+        chunk_max = cmax(y)
+        later = chunk_max > self._cmax
+        self._tmax = np.where(later, tmax(t, y), self._tmax)
+        self._cmax = np.maximum(self._cmax, chunk_max)
+
+        if self._t is not None:
+            t = np.concatenate([self._t[:-1], t])
+            y = np.concatenate([self._y[..., :-1], y], axis=-1)
+        self._t = t[-self.points:]
+        self._y = y[..., -self.points:]
+
+    def result(self):
+        """
+        Returns the metrics of the time points given so far, see summarise.
+        """
+        if self._t is None:
+            raise ValueError("No time points were given")
+        above = (self._above if self.threshold is not None
+                 else np.full(self._auc.shape, np.nan))
+        return {'auc': self._auc.copy(),
+                'cmax': self._cmax.copy(),
+                'tmax': self._tmax.copy(),
+                'half_life': half_life(self._t, self._y, self.points),
+                'time_above': above.copy()}
+
+
+class MetricsSink(Sink):
+    """
+    A sink keeping the metrics of each solution rather than the solution
+
+    Given to Solution, with analyse_models(keep=False), the trajectories of
+    the models are discarded as soon as their metrics are computed.
+
+    Parameters
+    ----------
+
+    threshold: None or float, optional.
+        Threshold of time_above, see summarise.
+
+    points: int, optional.
+        Number of terminal time points of half_life.
+
+    Attributes
+    ----------
+
+    .metrics: a dict of dicts
+        The metrics of each solution, keyed by model name, as returned by
+        summarise with one value per compartment.
+
+    """
+
+    def __init__(self, threshold=None, points=3):
+        self.threshold = threshold
+        self.points = points
+        self.metrics = {}
+
+    def write(self, model, sol):
+        self.metrics[model.model_args['name']] = summarise(
+            sol.t, sol.y, self.threshold, self.points)
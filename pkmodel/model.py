@@ -1,6 +1,85 @@
 #
 # Model class
 #
+import bisect
+
+import numpy as np
+
+
+# Compiled factories of generated right hand sides, keyed by topology
+_generated = {}
+
+
+def _generated_source(components, dose_type):
+    # Source of a factory binding the arguments of a model of the given
+    # topology to a straight-line right hand side and Jacobian. Expressions
+    # follow rhs and make_matrix term by term, so that results are the
+    # same to the bit. The peripheral rates are added with sum(), as in rhs,
+    # because sum() of floats is compensated on some python versions
+    c = 1 if dose_type == 'sc' else 0
+    m = components - 1 - c
+    V = ['V_p%d' %i for i in range(1, m + 1)]
+    Q = ['Q_p%d' %i for i in range(1, m + 1)]
+    q = ['q_p%d' %i for i in range(1, m + 1)]
+    T = ['t_p%d' %i for i in range(1, m + 1)]
+
+    def unpack(names):
+        return '(' + ''.join(name + ', ' for name in names) + ')'
+
+    k_a = 'k_a, ' if dose_type == 'sc' else ''
+    lines = ['def factory(dose, args):',
+             '    %s%s, %s, CL = args' %(k_a, unpack(['V_c'] + V), unpack(Q)),
+             '',
+             '    def rhs(t, y):']
+    if dose_type == 'sc':
+        lines.append('        q_0 = y[0]')
+    lines.append('        q_c = y[%d]' %c)
+    for i in range(m):
+        lines.append('        %s = y[%d]' %(q[i], c + 1 + i))
+    for i in range(m):
+        lines.append('        %s = %s*(q_c/V_c - %s/%s)' %(T[i], Q[i], q[i], V[i]))
+    transitions = 'sum(%s)' %unpack(T)
+    if dose_type == 'sc':
+        lines.append('        dq0_dt = dose(t) - k_a*q_0')
+        lines.append('        dqc_dt = k_a*q_0 - (q_c/V_c)*CL - %s' %transitions)
+        outputs = ['dq0_dt', 'dqc_dt'] + T
+    else:
+        lines.append('        dqc_dt = dose(t) - (q_c/V_c)*CL - %s' %transitions)
+        outputs = ['dqc_dt'] + T
+    lines.append('        return [%s]' %', '.join(outputs))
+
+    # Rate matrix, as assembled by make_matrix
+    K = [['0.0'] * components for _ in range(components)]
+    if dose_type == 'sc':
+        K[0][0] = '-k_a'
+        K[1][0] = 'k_a'
+    K[c][c] = ' - '.join(['-CL/V_c'] + ['%s/V_c' %Q_i for Q_i in Q])
+    for i in range(m):
+        p = c + 1 + i
+        K[c][p] = '%s/%s' %(Q[i], V[i])
+        K[p][c] = '%s/V_c' %Q[i]
+        K[p][p] = '-%s/%s' %(Q[i], V[i])
+    lines += ['',
+              '    K = array([%s])' %', '.join('[%s]' %', '.join(row)
+                                               for row in K),
+              '',
+              '    def jac(t, y):',
+              '        return K',
+              '',
+              '    return rhs, jac']
+    return '\n'.join(lines) + '\n'
+
+
+def _generated_factory(components, dose_type):
+    # Compiles the factory of a topology once per process
+    key = (components, dose_type)
+    if key not in _generated:
+        source = _generated_source(components, dose_type)
+        namespace = {'array': np.array}
+        exec(compile(source, '<pkmodel rhs %d %s>' %key, 'exec'), namespace)
+        _generated[key] = namespace['factory']
+    return _generated[key]
+
 
 class Model:
     """
@@ -40,11 +119,27 @@ class Model:
         'sc' = subcutaneous
         'iv' = intravenous
 
-    :param dose_t: ndarray
+    :param dose_t: float or ndarray or Regimen
+        A constant dose, the dose at each time point of dose_grid, or a
+        Regimen (or any callable) giving the dose at any time
+
+    :param dose_grid: ndarray, optional
+        Increasing time points at which dose_t is given, e.g. Protocol.t.
+        The dose is linearly interpolated between them. If None, the
+        time points of the Solution solving the model are used.
+
+    :param engine: str, optional
+        'list' = the right hand side is built from python lists (default)
+        'matrix' = the right hand side is a single matrix-vector product
+        with the rate matrix assembled by make_matrix
+        'generated' = the right hand side and Jacobian are straight-line
+        python functions generated for the number of components and dose
+        type of the model, see make_generated
     """
 
 
-    def __init__(self, components,model_args,dose_type,dose_t):
+    def __init__(self, components,model_args,dose_type,dose_t,engine='list',
+                 dose_grid=None):
         # Preconditions to ensure that the correct number of properties are provided
         # for the desired model and that the inputs are correct.
         if dose_type == 'sc' and components < 2:
@@ -60,6 +155,10 @@ class Model:
         if dose_type != 'sc' and dose_type!='iv':
            raise ValueError("Not a valid form of injection. 'sc' or 'iv' required")
 
+        if engine not in ('list', 'matrix', 'generated'):
+            raise ValueError("Not a valid engine. "
+                             "'list', 'matrix' or 'generated' required")
+
         values = list(model_args.values())
         assert all(value >= 0 for value in values[1:]), 'All model properties\
             must be >= 0'
@@ -68,7 +167,13 @@ class Model:
         self.model_args = model_args
         self.dose_type = dose_type
         self.dose_t = dose_t
-        self.counter = 0
+        self.engine = engine
+        self.dose_grid = None
+        # If True, boluses of a regimen are left out of the dose and
+        # applied as impulses by the solver, see bolus_events
+        self.impulse_doses = False
+        if dose_grid is not None:
+            self.set_dose_grid(dose_grid)
 
     
     def make_args(self):
@@ -96,6 +201,138 @@ class Model:
         return args
 
 
+    def compartment_names(self):
+        # Names of the compartments in the order of the state vector
+        names = ['q_c'] + ['q_p%d' %i for i in range(1, self.components)]
+        if self.dose_type == 'sc':
+            names = ['q_0'] + names[:-1]
+        return names
+
+
+    def make_matrix(self, args=None):
+        # Assembles the rate matrix K of the linear system
+        # dq/dt = K q + dose, using the arguments from make_args.
+        # The dose always enters the first compartment (q_0 for 'sc'
+        # and q_c for 'iv').
+        if args is None:
+            args = self.make_args()
+
+        K = np.zeros((self.components, self.components))
+        if self.dose_type == 'sc':
+            k_a, vols, Q_rates, CL = args
+            K[0, 0] = -k_a
+            K[1, 0] = k_a
+            c = 1
+        else:
+            vols, Q_rates, CL = args
+            c = 0
+
+        K[c, c] = -CL/vols[0]
+        for i in range(1, len(Q_rates) + 1):
+            p = c + i
+            K[c, c] -= Q_rates[i-1]/vols[0]
+            K[c, p] = Q_rates[i-1]/vols[i]
+            K[p, c] = Q_rates[i-1]/vols[0]
+            K[p, p] = -Q_rates[i-1]/vols[i]
+
+        return K
+
+
+    def parameter_names(self):
+        # Names of the parameters in the order of make_args
+        peripherals = range(1, self.components - (self.dose_type == 'sc'))
+        names = (['V_c'] + ['V_p%d' %i for i in peripherals]
+                 + ['Q_p%d' %i for i in peripherals] + ['CL'])
+        if self.dose_type == 'sc':
+            names = ['k_a'] + names
+        return names
+
+
+    def make_matrix_derivatives(self, args=None):
+        # Derivatives dK/dtheta of the rate matrix with respect to each
+        # parameter of parameter_names, as an array of shape (P, n, n)
+        if args is None:
+            args = self.make_args()
+
+        n = self.components
+        if self.dose_type == 'sc':
+            k_a, vols, Q_rates, CL = args
+            c = 1
+        else:
+            vols, Q_rates, CL = args
+            c = 0
+
+        m = len(Q_rates)
+        dK = np.zeros((len(self.parameter_names()), n, n))
+        if self.dose_type == 'sc':
+            dK[0, 0, 0] = -1.0
+            dK[0, 1, 0] = 1.0
+
+        # Offsets of V_c, V_pi, Q_pi and CL among the parameters
+        V, Q, L = c, c + 1 + m, c + 1 + 2*m
+        V_c = vols[0]
+        dK[L, c, c] = -1/V_c
+        dK[V, c, c] = (CL + sum(Q_rates))/V_c**2
+        for i in range(1, m + 1):
+            p = c + i
+            Q_i, V_i = Q_rates[i-1], vols[i]
+            dK[Q + i - 1, c, c] = -1/V_c
+            dK[Q + i - 1, c, p] = 1/V_i
+            dK[Q + i - 1, p, c] = 1/V_c
+            dK[Q + i - 1, p, p] = -1/V_i
+            dK[V + i, c, p] = -Q_i/V_i**2
+            dK[V + i, p, p] = Q_i/V_i**2
+            dK[V, p, c] = -Q_i/V_c**2
+
+        return dK
+
+
+    def make_sensitivity_matrix(self, args=None):
+        # Rate matrix of the state q augmented with its sensitivities
+        # S_j = dq/dtheta_j, which follow dS_j/dt = K S_j + dK/dtheta_j q.
+        # The augmented system [q, S_1, ..., S_P] is linear with the dose
+        # entering q only, like the model itself
+        if args is None:
+            args = self.make_args()
+
+        K = self.make_matrix(args)
+        dK = self.make_matrix_derivatives(args)
+        P, n = len(dK), self.components
+        M = np.kron(np.eye(P + 1), K)
+        M[n:, :n] = dK.reshape(P * n, n)
+        return M
+
+
+    def jacobian(self,t,y,args):
+        # Analytic Jacobian of rhs. The system is linear and the dose does
+        # not depend on y, so the Jacobian is the constant rate matrix
+        return self.make_matrix(args)
+
+
+    def jac_sparsity(self):
+        # Sparsity pattern of the Jacobian: the central compartment is
+        # coupled to every peripheral compartment (and to q_0 for 'sc'),
+        # peripheral compartments are not coupled to each other
+        S = np.eye(self.components, dtype=bool)
+        if self.dose_type == 'sc':
+            S[1, 0] = True
+            c = 1
+        else:
+            c = 0
+
+        S[c, c:] = True
+        S[c:, c] = True
+        return S
+
+
+    def bolus_events(self, t_start, t_end):
+        # Times and amounts of the boluses of the dose regimen between
+        # t_start and t_end, which enter the first compartment
+        if hasattr(self.dose_t, 'bolus_events'):
+            return self.dose_t.bolus_events(t_start, t_end)
+        return np.empty(0), np.empty(0)
+
+
     def get_peripheral_rates(self,v_x,q_x,Q_px):
         # Calculate dqpx_dt for all components present
         total = []
@@ -105,11 +342,60 @@ class Model:
         return total
 
 
-    def dose(self):
-        # Return the dose at time t
-        X = self.dose_t[self.counter]
-        self.counter += 1
-        return X
+    def set_dose_grid(self, dose_grid):
+        # Precompute the interpolant of dose_t over the time points of
+        # dose_grid, so that dose(t) is a lookup rather than a search
+        # over the whole schedule
+        grid = np.asarray(dose_grid, dtype=float)
+        if callable(self.dose_t):
+            # Regimens are evaluated directly and need no interpolant
+            self.dose_grid = grid
+            return
+
+        values = np.asarray(self.dose_t, dtype=float).ravel()
+        if values.size > 1 and values.shape != grid.shape:
+            raise ValueError("The dose must be given at every time point "
+                             "of the dose grid")
+
+        self.dose_grid = grid
+        if values.size > 1:
+            steps = np.diff(grid)
+            self._dose_values = values.tolist()
+            self._dose_slopes = (np.diff(values) / steps).tolist()
+            self._dose_times = grid.tolist()
+            # Uniform grids are indexed directly, others by bisection
+            uniform = np.allclose(steps, steps[0], rtol=1e-9, atol=0)
+            self._dose_step = float(steps[0]) if uniform else None
+
+
+    def dose(self, t):
+        # Return the dose at time t, or at each time of an array t
+        if callable(self.dose_t):
+            if self.impulse_doses and hasattr(self.dose_t, 'infusion_rate'):
+                return self.dose_t.infusion_rate(t)
+            return self.dose_t(t)
+
+        if np.size(self.dose_t) == 1:
+            X = float(np.ravel(self.dose_t)[0])
+            return X if np.ndim(t) == 0 else np.full(np.shape(t), X)
+
+        if self.dose_grid is None:
+            raise ValueError("The dose grid of the model is not defined")
+
+        if np.ndim(t) != 0:
+            return np.interp(t, self.dose_grid, self._dose_values)
+
+        times = self._dose_times
+        if t <= times[0]:
+            return self._dose_values[0]
+        if t >= times[-1]:
+            return self._dose_values[-1]
+
+        if self._dose_step is not None:
+            i = min(int((t - times[0]) / self._dose_step), len(times) - 2)
+        else:
+            i = bisect.bisect_right(times, t) - 1
+        return self._dose_values[i] + self._dose_slopes[i]*(t - times[i])
 
 
     def rhs(self,t,y,args):
@@ -119,7 +405,7 @@ class Model:
             k_a, v_x, Q_px, CL  = args[0], args[1], args[2], args[3]
             q_0, q_x = y[0], y[1:]
 
-            dq0_dt = self.dose() - k_a*q_0
+            dq0_dt = self.dose(t) - k_a*q_0
             transitions = self.get_peripheral_rates(v_x,q_x,Q_px)
             dqc_dt = k_a*q_0 - (q_x[0]/v_x[0])*CL - sum(transitions)
             
@@ -128,7 +414,25 @@ class Model:
             v_x, Q_px, CL  = args[0], args[1], args[2]
             q_x  = y
             transitions = self.get_peripheral_rates(v_x,q_x,Q_px)
-            dqc_dt = self.dose() - (q_x[0]/v_x[0])*CL - sum(transitions)
+            dqc_dt = self.dose(t) - (q_x[0]/v_x[0])*CL - sum(transitions)
 
             return [dqc_dt] + transitions
 
+
+    def make_generated(self, args=None):
+        # Returns the right hand side and Jacobian of the model as functions
+        # of (t, y) with the arguments from make_args bound. They are
+        # compiled from generated source once per number of components and
+        # dose type, and give the same results as rhs and make_matrix
+        if args is None:
+            args = self.make_args()
+        factory = _generated_factory(self.components, self.dose_type)
+        return factory(self.dose, args)
+
+
+    def rhs_matrix(self,t,y,K):
+        # Matrix form of rhs, K being the rate matrix from make_matrix
+        dq_dt = K.dot(y)
+        dq_dt[0] += self.dose(t)
+        return dq_dt
+
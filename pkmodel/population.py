@@ -0,0 +1,202 @@
+#
+# Population class
+#
+import numpy as np
+
+from .model import Model
+from .solution import Solution
+
+
+class Population:
+    """
+    A virtual population of Pharmokinetic (PK) models
+
+    Generates the parameters of many models sharing one topology (number
+    of components and dose type) from fixed values, grids or random
+    distributions. Subjects are built and solved in fixed-size chunks, so
+    memory stays bounded however large the population is.
+
+    Parameters
+    ----------
+
+    :param components: integer
+        Number of model components of every subject, see Model.
+
+    :param dose_type: str
+        'sc' = subcutaneous
+        'iv' = intravenous
+
+    :param dose_t: float or ndarray
+        Dose of every subject, see Model.
+
+    :param parameters: dict
+        The model properties of the topology ('V_c', 'V_pN', 'Q_pN', 'CL'
+        and 'k_a' for 'sc'), each given as one of:
+
+        float = the same value for every subject
+        list or ndarray = a grid of values. The population is the cartesian
+        product of all grids.
+        callable = a distribution, called as f(rng, size) with a numpy
+        Generator and returning size values,
+        e.g. lambda rng, size: rng.lognormal(0.0, 0.2, size)
+
+        {'V_c' : [1.0, 2.0],
+         'CL' : lambda rng, size: rng.normal(1.0, 0.1, size),
+         ...
+        }
+
+    :param size: int, optional
+        Number of subjects per grid point. Required if no parameter is a
+        grid, defaults to 1 otherwise.
+
+    :param seed: int, optional
+        Seed of the random number generator. For a given seed, subjects do
+        not depend on the chunk size used to evaluate them.
+
+    :param dose_grid: ndarray, optional
+        Dose grid of every subject, see Model.
+
+    :param name: str, optional
+        Prefix of the model names, followed by the index of the subject.
+
+    """
+
+    def __init__(self, components, dose_type, dose_t, parameters, size=None,
+                 seed=None, dose_grid=None, name='subject'):
+        keys = ['V_c', 'CL'] + ['k_a'] * (dose_type == 'sc')
+        peripherals = components - 1 - (dose_type == 'sc')
+        for i in range(1, peripherals + 1):
+            keys += ['V_p%d' % i, 'Q_p%d' % i]
+
+        if set(keys) != set(parameters.keys()):
+            raise ValueError("Population incorrectly defined. Parameters "
+                             "must be exactly %s" % sorted(keys))
+
+        self._grids = {}
+        self._distributions = {}
+        self._fixed = {}
+        for key, value in parameters.items():
+            if callable(value):
+                self._distributions[key] = value
+            elif np.ndim(value) > 0:
+                self._grids[key] = np.asarray(value, dtype=float)
+            else:
+                self._fixed[key] = float(value)
+
+        if size is None and not self._grids:
+            raise ValueError("The size of the population must be given "
+                             "if no parameter is a grid")
+
+        self.components = components
+        self.dose_type = dose_type
+        self.dose_t = dose_t
+        self.dose_grid = dose_grid
+        self.name = name
+        self.size = 1 if size is None else size
+        self._keys = keys
+        self._grid_shape = tuple(len(grid) for grid in self._grids.values())
+
+        # One independent stream per distribution, so that the values of a
+        # subject do not depend on how the population is chunked
+        streams = np.random.SeedSequence(seed).spawn(len(self._distributions))
+        self._streams = dict(zip(self._distributions, streams))
+        self._rngs = None
+        self._drawn = 0
+
+    def __len__(self):
+        return int(np.prod(self._grid_shape, dtype=int)) * self.size
+
+    def parameters(self, start, stop):
+        """
+        Returns the parameters of the subjects with indices in [start, stop)
+        as a dict of arrays.
+
+        Random values are drawn in order of subject index, so chunks
+        should be requested in increasing order. Requesting an earlier
+        chunk restarts the random streams.
+        """
+        stop = min(stop, len(self))
+        if self._rngs is None or start != self._drawn:
+            self._rngs = {key: np.random.default_rng(stream)
+                          for key, stream in self._streams.items()}
+            self._drawn = 0
+            if start > 0:
+                self._draw(start)
+
+        index = np.arange(start, stop)
+        values = {key: np.full(len(index), value)
+                  for key, value in self._fixed.items()}
+
+        # Grid points vary slowest, subjects of a grid point fastest
+        if self._grids:
+            grid_index = np.unravel_index(index // self.size,
+                                          self._grid_shape)
+            for (key, grid), i in zip(self._grids.items(), grid_index):
+                values[key] = grid[i]
+
+        values.update(self._draw(stop - start))
+        return values
+
+    def _draw(self, count):
+        # Draws the next count values of every distribution
+        self._drawn += count
+        return {key: np.asarray(f(self._rngs[key], count), dtype=float)
+                for key, f in self._distributions.items()}
+
+    def models(self, start, stop):
+        """
+        Returns a list of Model instances of the subjects with indices in
+        [start, stop).
+        """
+        return self._build(start, self.parameters(start, stop))
+
+    def _build(self, start, values):
+        # Builds the models of consecutive subjects from their parameters
+        models = []
+        for j in range(len(values['V_c'])):
+            model_args = {'name': self.name + str(start + j)}
+            model_args.update({key: values[key][j] for key in self._keys})
+            models.append(Model(self.components, model_args, self.dose_type,
+                                self.dose_t, dose_grid=self.dose_grid))
+        return models
+
+    def sweep(self, t_eval, y0=None, chunk_size=1000, **solution_options):
+        """
+        Solves the population in chunks of chunk_size subjects, yielding
+        the results of each chunk as soon as it is solved.
+
+        Parameters
+        ----------
+
+        t_eval: array_like, required.
+            Time steps at which the solutions should be computed.
+
+        y0: list, optional.
+            Initial amount of drug in all compartments, the same for every
+            subject. Defaults to no drug.
+
+        chunk_size: int, optional.
+            Number of subjects solved at a time.
+
+        solution_options: optional.
+            Keyword arguments passed to Solution, e.g. batch=True.
+
+        Yields
+        ------
+
+        :return (start, parameters, sol_list): the index of the first
+            subject of the chunk, the parameters of its subjects as returned
+            by the parameters method and their solutions as returned by
+            Solution.analyse_models. Nothing is saved to disk.
+
+        """
+        if y0 is None:
+            y0 = [0.0] * self.components
+
+        for start in range(0, len(self), chunk_size):
+            stop = min(start + chunk_size, len(self))
+            values = self.parameters(start, stop)
+            models = self._build(start, values)
+            solution = Solution(models, t_eval, [y0] * len(models),
+                                **solution_options)
+            yield start, values, solution._solve_models()
@@ -0,0 +1,217 @@
+#
+# Propagator class
+#
+import numpy as np
+
+
+class Propagator:
+    """
+    An exact propagator for a linear Pharmokinetic (PK) model
+
+    Every model defined by the Model class is a linear system with
+    constant coefficients
+
+        dq/dt = K q + e_0 u(t)
+
+    where K is the rate matrix of the model and u(t) the dose, which
+    always enters the first compartment. If u(t) is piecewise constant or
+    piecewise linear between the evaluation times, the system is solved
+    exactly over each interval by the matrix exponential of the augmented
+    system
+
+        d/dt [q, u, s] = [[K, e_0, 0], [0, 0, 1], [0, 0, 0]] [q, u, s]
+
+    where s is the slope of the dose over the interval. Matrix exponentials
+    are cached by interval length (rounded to 1e-12), so a uniform time
+    grid needs only one.
+
+    Parameters
+    ----------
+
+    :param K: ndarray, required.
+        The rate matrix of the model, see Model.make_matrix
+
+    :param dose_input: str, optional.
+        'linear' = the dose is linearly interpolated between time points
+        (default)
+        'constant' = the dose is held constant over each interval at its
+        value at the start of the interval
+
+    """
+
+    def __init__(self, K, dose_input='linear'):
+        if dose_input not in ('linear', 'constant'):
+            raise ValueError("Not a valid dose input. "
+                             "'linear' or 'constant' required")
+
+        n = np.shape(K)[0]
+        A = np.zeros((n + 2, n + 2))
+        A[:n, :n] = K
+        A[0, n] = 1.0
+        A[n, n + 1] = 1.0
+
+        self.K = K
+        self.dose_input = dose_input
+        self._A = A
+        self._cache = {}
+
+    def step_matrices(self, h):
+        """
+        Returns the blocks (Phi, G_0, G_1) of the matrix exponential of
+        the augmented system over an interval of length h, such that
+
+            q(t + h) = Phi q(t) + G_0 u(t) + G_1 s
+
+        """
+        key = float(h)
+        if key not in self._cache:
+            self._cache[key] = self._step_matrices(key)
+        return self._cache[key]
+
+    def _step_matrices(self, h):
+        # Uncached step_matrices, for step sizes that are not reused
+        import scipy.linalg
+
+        n = self._A.shape[0] - 2
+        E = scipy.linalg.expm(self._A * h)
+        return E[:n, :n], E[:n, n], E[:n, n + 1]
+
+    def propagate(self, t_eval, y0, dose, dense_output=False):
+        """
+        Propagates the initial conditions over the provided time points.
+
+        Parameters
+        ----------
+
+        t_eval: array_like, required.
+            Increasing time points at which the solution is computed.
+
+        y0: array_like, required.
+            Initial amount of drug in all compartments at t_eval[0].
+
+        dose: array_like, required.
+            Dose at each of the time points in t_eval.
+
+        dense_output: bool, optional.
+            If True then the solution includes the exact solution between
+            the time points as 'sol', a callable of a time or an array of
+            times, see PropagatorInterpolant.
+
+        Returns
+        -------
+
+        :return sol: Bunch object with the same fields as the one returned
+            by scipy's solve_ivp. Time points are defined as 't' and values
+            of solution are defined as 'y'.
+
+        """
+        t = np.asarray(t_eval, dtype=float)
+        u = np.broadcast_to(np.asarray(dose, dtype=float), t.shape)
+        h = np.diff(t)
+
+        if self.dose_input == 'linear':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                s = np.where(h > 0, np.diff(u) / h, 0.0)
+        else:
+            s = np.zeros_like(h)
+
+        # Equal step sizes share one matrix exponential
+        steps, index = np.unique(np.round(h, 12), return_inverse=True)
+        matrices = [self.step_matrices(step) for step in steps]
+
+        # Dose forcing of every interval, q_(i+1) = Phi q_i + F_i
+        n = len(y0)
+        F = np.empty((n, len(h)))
+        for j, (Phi, G_0, G_1) in enumerate(matrices):
+            inside = index == j
+            F[:, inside] = (np.outer(G_0, u[:-1][inside])
+                            + np.outer(G_1, s[inside]))
+
+        y = np.empty((n, len(t)))
+        y[:, 0] = y0
+        if len(matrices) == 1:
+            y[:, 1:] = self._filter(matrices[0][0], y[:, 0], F)
+        else:
+            q = y[:, 0]
+            for i, j in enumerate(index):
+                q = matrices[j][0].dot(q) + F[:, i]
+                y[:, i + 1] = q
+
+        from scipy.optimize import OptimizeResult
+        sol = PropagatorInterpolant(self, t, y, u, s) if dense_output else None
+        return OptimizeResult(t=t, y=y, sol=sol, t_events=None,
+                              y_events=None, nfev=0, njev=0, nlu=0,
+                              nexpm=len(steps), status=0,
+                              message='The propagation succeeded.',
+                              success=True)
+
+    def _filter(self, Phi, q0, F):
+        # Runs the recurrence q_(i+1) = Phi q_i + F_i of a uniform grid.
+        # In the eigenvectors of Phi each mode is a first-order recursive
+        # filter, run by lfilter rather than a python loop over intervals
+        import scipy.signal
+
+        lam, V = np.linalg.eig(Phi)
+        if np.linalg.cond(V) > 1e6:
+            # Nearly defective matrices are propagated step by step
+            out = np.empty_like(F)
+            q = q0
+            for i in range(F.shape[1]):
+                q = Phi.dot(q) + F[:, i]
+                out[:, i] = q
+            return out
+
+        z0 = np.linalg.solve(V, q0.astype(V.dtype))
+        Fz = np.linalg.solve(V, F.astype(V.dtype))
+        Z = np.empty_like(Fz)
+        for k in range(len(lam)):
+            Z[k], _ = scipy.signal.lfilter([1.0], [1.0, -lam[k]], Fz[k],
+                                           zi=[lam[k] * z0[k]])
+        return V.dot(Z).real
+
+
+class PropagatorInterpolant:
+    """
+    The exact solution of a propagation between its time points
+
+    Between the time points t_i and t_(i+1) the solution is
+
+        q(t_i + h) = Phi(h) q(t_i) + G_0(h) u(t_i) + G_1(h) s_i
+
+    for the dose u and slope s of the interval, see Propagator. Each
+    evaluation time needs its own matrix exponential, so the interpolant
+    suits sparse sampling times. Times outside the propagation are
+    extrapolated from the nearest interval.
+
+    Parameters
+    ----------
+
+    :param propagator: Propagator instance, required.
+
+    :param t, y: ndarray, required.
+        Time points and solution of the propagation.
+
+    :param u, s: ndarray, required.
+        Dose at each time point and slope of the dose over each interval.
+
+    """
+
+    def __init__(self, propagator, t, y, u, s):
+        self.propagator = propagator
+        self.t = t
+        self.y = y
+        self.u = u
+        self.s = s
+
+    def __call__(self, t):
+        times = np.atleast_1d(np.asarray(t, dtype=float))
+        i = np.clip(np.searchsorted(self.t, times, side='right') - 1,
+                    0, max(len(self.t) - 2, 0))
+        h = times - self.t[i]
+
+        out = np.empty((self.y.shape[0], len(times)))
+        for k, (j, step) in enumerate(zip(i, h)):
+            Phi, G_0, G_1 = self.propagator._step_matrices(step)
+            s = self.s[j] if j < len(self.s) else 0.0
+            out[:, k] = Phi.dot(self.y[:, j]) + G_0 * self.u[j] + G_1 * s
+        return out[:, 0] if np.ndim(t) == 0 else out
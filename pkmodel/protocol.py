@@ -1,3 +1,5 @@
+import numbers
+
 import numpy as np
 
 class Protocol(object):
@@ -21,8 +23,9 @@ class Protocol(object):
 	
 	T1: first time point of injection
 	T2: second time point of injection 
+	sigma: width of each injection
 	
-	Possibility to add other time points if needed ie: add a T3 variable  
+	Any number of injections is given by the times and amounts arrays.
 	
 	-----------
 	
@@ -47,24 +50,43 @@ class Protocol(object):
 	
 	# Protocol 1: Instantaneous drug dose injection
 	
-	def instantaneous_dose(self,k=1,T1=10,T2=30,sigma=1):
+	def instantaneous_dose(self,k=1,T1=10,T2=30,sigma=1,times=None,amounts=None):
 	
+		"""
+		Returns a sum of boluses, each a Gaussian of width sigma truncated
+		at 3*sigma and peaking at its amount. By default there are two
+		boluses, of quantity at T1 and k*quantity at T2. Any number of
+		boluses is given by times and amounts (a scalar or one amount per
+		time, defaulting to quantity).
+		"""
+		
+		for value in (k, T1, T2, sigma):
+			if not isinstance(value, numbers.Real):
+				raise TypeError("k, T1, T2 and sigma must be real numbers")
+		
 		quantity, t= self.quantity, self.t
 		self.k = k
 		self.T1 = T1
 		self.T2 = T2
 		self.sigma = sigma
-		X=np.zeros_like(t)
-	     
-		from scipy.stats import norm
 		
-		for i,time in enumerate(t):
-			if ((time>T1-3*sigma) and (time<T1+3*sigma)):
-				X[i] =  quantity * np.sqrt(2*np.pi) * sigma * norm.pdf(time,T1,sigma) 
-			elif ((time>T2-3*sigma) and (time<T2+3*sigma)):
-				X[i] =  k * quantity * np.sqrt(2*np.pi) * sigma * norm.pdf(time,T2,sigma) 
-			if ((time>T1-3*sigma) and (time<T2+3*sigma)): 
-				X[i] =  k * quantity * np.sqrt(2*np.pi) * sigma * (norm.pdf(time,T1,sigma) + norm.pdf(time,T2,sigma))
+		if times is None:
+			times = [T1, T2]
+			amounts = [quantity, k * quantity]
+		elif amounts is None:
+			amounts = quantity
+		times = np.asarray(times, dtype=float).ravel()
+		amounts = np.broadcast_to(np.asarray(amounts, dtype=float), times.shape)
+		self.times = times
+		self.amounts = amounts
+		
+		# Each bolus only changes the points of its window, found by
+		# bisection of the sorted time points
+		X = np.zeros_like(t, dtype=float)
+		start = np.searchsorted(t, times - 3*sigma, side='right')
+		stop = np.searchsorted(t, times + 3*sigma, side='left')
+		for T, amount, i, j in zip(times, amounts, start, stop):
+			X[i:j] += amount * np.exp(-0.5 * ((t[i:j] - T) / sigma)**2)
 		return X
 		
 	# Protocol 2: Steady injection of drug over time 
@@ -0,0 +1,330 @@
+#
+# Dose regimen classes
+#
+import math
+
+import numpy as np
+
+
+# Area of a unit Gaussian of unit width truncated at 3 widths, by which the
+# Gaussian of a bolus is divided so that it delivers its amount
+_BOLUS_AREA = math.sqrt(2 * math.pi) * math.erf(3 / math.sqrt(2))
+
+
+class Regimen:
+    """
+    A Pharmokinetic (PK) dose regimen
+
+    A regimen is the dose rate as a function of continuous time, and can be
+    evaluated at a scalar time or an array of times without materialising
+    the schedule on a grid. Regimens are added together with +, and can be
+    given to Model in place of a dose array, e.g.
+
+        regimen = (loading_dose(100, 50, tau=12)
+                   + Infusion(starts=[24], ends=[30], rates=[5]))
+        model = pk.Model(2, model_args, 'iv', regimen)
+
+    Boluses can also be given as discrete events, see bolus_events, which
+    Solution applies as impulses with impulse_doses=True, integrating only
+    the remaining infusion_rate between them.
+
+    Subclasses implement rate, and bolus_events and infusion_rate if they
+    contain boluses, and breakpoints so that incremental solves can detect
+    where two regimens differ.
+    """
+
+    def rate(self, t):
+        raise NotImplementedError
+
+    def infusion_rate(self, t):
+        # Dose rate excluding boluses
+        return self.rate(t)
+
+    def bolus_events(self, t_start, t_end):
+        # Times and amounts of the boluses in [t_start, t_end]
+        return np.empty(0), np.empty(0)
+
+    def breakpoints(self, t_start, t_end):
+        # Times in [t_start, t_end] at which the rate starts, stops or
+        # changes shape, such that two regimens agreeing at the breakpoints
+        # of both agree in between. None if they are not known
+        return None
+
+    def __call__(self, t):
+        return self.rate(t)
+
+    def __add__(self, other):
+        return CombinedRegimen([self, other])
+
+    def __radd__(self, other):
+        # Allows sum() over regimens
+        if other == 0:
+            return self
+        return CombinedRegimen([other, self])
+
+
+def _bolus_breakpoints(times, sigma, t_start, t_end):
+    # Start, peak and end of each bolus shaped as in Bolus
+    points = np.concatenate([times - 3*sigma, times, times + 3*sigma])
+    return np.unique(points[(points >= t_start) & (points <= t_end)])
+
+
+def _windowed_sum(t, first, last, term):
+    # Sums term(t, k) over the integers first <= k <= last, for scalar or
+    # array t, where first and last depend on t
+    if np.ndim(t) == 0:
+        return float(sum(term(t, k) for k in range(int(first), int(last) + 1)))
+
+    t = np.asarray(t, dtype=float)
+    first = np.asarray(first, dtype=np.int64)
+    last = np.asarray(last, dtype=np.int64)
+    X = np.zeros_like(t)
+    width = int(np.max(last - first, initial=-1)) + 1
+    for offset in range(width):
+        k = first + offset
+        inside = k <= last
+        X[inside] += term(t[inside], k[inside])
+    return X
+
+
+class Bolus(Regimen):
+    """
+    Boluses at arbitrary times
+
+    Each bolus is a Gaussian of width sigma, truncated at 3*sigma and
+    scaled to deliver exactly its amount, as it does when given as an
+    impulse (see Regimen). Unlike Protocol.instantaneous_dose, whose
+    boluses peak at their amount, the rate therefore peaks at about
+    amount / (2.5 * sigma). Evaluating the rate at a time costs O(log k)
+    for k boluses.
+
+    Parameters
+    ----------
+
+    times: array_like, required
+        Times of the boluses.
+
+    amounts: float or array_like, required
+        Amount of each bolus, or one amount for all.
+
+    sigma: float, optional
+        Width of each bolus.
+
+    """
+
+    def __init__(self, times, amounts, sigma=1):
+        times = np.asarray(times, dtype=float).ravel()
+        amounts = np.broadcast_to(np.asarray(amounts, dtype=float),
+                                  times.shape)
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.amounts = amounts[order]
+        self.sigma = sigma
+
+    def rate(self, t):
+        first = np.searchsorted(self.times, np.subtract(t, 3*self.sigma),
+                                side='right')
+        last = np.searchsorted(self.times, np.add(t, 3*self.sigma),
+                               side='left') - 1
+        return _windowed_sum(t, first, last, self._term)
+
+    def infusion_rate(self, t):
+        return 0.0 if np.ndim(t) == 0 else np.zeros(np.shape(t))
+
+    def bolus_events(self, t_start, t_end):
+        i = np.searchsorted(self.times, t_start, side='left')
+        j = np.searchsorted(self.times, t_end, side='right')
+        return self.times[i:j], self.amounts[i:j]
+
+    def breakpoints(self, t_start, t_end):
+        return _bolus_breakpoints(self.times, self.sigma, t_start, t_end)
+
+    def _term(self, t, k):
+        return (self.amounts[k] / (_BOLUS_AREA * self.sigma)
+                * np.exp(-0.5 * ((t - self.times[k]) / self.sigma)**2))
+
+
+class RepeatedBolus(Regimen):
+    """
+    A bolus repeated every tau hours
+
+    Boluses are shaped as in Bolus. Their times are not stored, so
+    evaluating the rate costs O(1) however long the schedule is.
+
+    Parameters
+    ----------
+
+    amount: float, required
+        Amount of each bolus.
+
+    tau: float, required
+        Time between boluses.
+
+    start: float, optional
+        Time of the first bolus.
+
+    count: None or int, optional
+        Number of boluses. If None then boluses repeat indefinitely.
+
+    sigma: float, optional
+        Width of each bolus.
+
+    """
+
+    def __init__(self, amount, tau, start=0, count=None, sigma=1):
+        if tau <= 0:
+            raise ValueError("The time between boluses must be positive")
+
+        self.amount = amount
+        self.tau = tau
+        self.start = start
+        self.count = count
+        self.sigma = sigma
+
+    def rate(self, t):
+        # Boluses strictly within 3*sigma of t, as in Bolus
+        first = np.maximum(np.floor((np.subtract(t, 3*self.sigma)
+                                     - self.start) / self.tau) + 1, 0)
+        last = np.ceil((np.add(t, 3*self.sigma) - self.start) / self.tau) - 1
+        if self.count is not None:
+            last = np.minimum(last, self.count - 1)
+        return _windowed_sum(t, first, last, self._term)
+
+    def infusion_rate(self, t):
+        return 0.0 if np.ndim(t) == 0 else np.zeros(np.shape(t))
+
+    def bolus_events(self, t_start, t_end):
+        first = max(np.ceil((t_start - self.start) / self.tau), 0)
+        last = np.floor((t_end - self.start) / self.tau)
+        if self.count is not None:
+            last = min(last, self.count - 1)
+        times = self.start + np.arange(first, last + 1) * self.tau
+        return times, np.full(len(times), float(self.amount))
+
+    def breakpoints(self, t_start, t_end):
+        times = self.bolus_events(t_start - 3*self.sigma,
+                                  t_end + 3*self.sigma)[0]
+        return _bolus_breakpoints(times, self.sigma, t_start, t_end)
+
+    def _term(self, t, k):
+        T = self.start + k * self.tau
+        return (self.amount / (_BOLUS_AREA * self.sigma)
+                * np.exp(-0.5 * ((t - T) / self.sigma)**2))
+
+
+class Infusion(Regimen):
+    """
+    Zero-order infusions over time windows
+
+    The rate is the sum of the rates of the windows containing t, with
+    windows closed at their start and open at their end. Windows may
+    overlap. Evaluating the rate costs O(log k) for k windows.
+
+    Parameters
+    ----------
+
+    starts: array_like, required
+        Start time of each window.
+
+    ends: array_like, required
+        End time of each window.
+
+    rates: float or array_like, required
+        Dose rate of each window, or one rate for all.
+
+    """
+
+    def __init__(self, starts, ends, rates):
+        starts = np.asarray(starts, dtype=float).ravel()
+        ends = np.asarray(ends, dtype=float).ravel()
+        if starts.shape != ends.shape or np.any(ends < starts):
+            raise ValueError("Every infusion window must have a start and "
+                             "an end after it")
+        rates = np.broadcast_to(np.asarray(rates, dtype=float), starts.shape)
+
+        # Piecewise constant total rate between the sorted window edges
+        self.breaks, index = np.unique(np.concatenate([starts, ends]),
+                                       return_inverse=True)
+        steps = np.zeros(len(self.breaks))
+        np.add.at(steps, index, np.concatenate([rates, -rates]))
+        self.levels = np.concatenate([[0.0], np.cumsum(steps)])
+
+    def breakpoints(self, t_start, t_end):
+        return self.breaks[(self.breaks >= t_start) & (self.breaks <= t_end)]
+
+    def rate(self, t):
+        X = self.levels[np.searchsorted(self.breaks, t, side='right')]
+        return float(X) if np.ndim(t) == 0 else X
+
+
+class CombinedRegimen(Regimen):
+    """
+    The sum of several regimens
+
+    Parameters
+    ----------
+
+    regimens: list of Regimen instances, required
+
+    """
+
+    def __init__(self, regimens):
+        self.regimens = []
+        for regimen in regimens:
+            if isinstance(regimen, CombinedRegimen):
+                self.regimens.extend(regimen.regimens)
+            else:
+                self.regimens.append(regimen)
+
+    def rate(self, t):
+        return sum(regimen.rate(t) for regimen in self.regimens)
+
+    def infusion_rate(self, t):
+        return sum(regimen.infusion_rate(t) for regimen in self.regimens)
+
+    def bolus_events(self, t_start, t_end):
+        events = [regimen.bolus_events(t_start, t_end)
+                  for regimen in self.regimens]
+        times = np.concatenate([event[0] for event in events])
+        amounts = np.concatenate([event[1] for event in events])
+        order = np.argsort(times, kind='stable')
+        return times[order], amounts[order]
+
+    def breakpoints(self, t_start, t_end):
+        breaks = [regimen.breakpoints(t_start, t_end)
+                  for regimen in self.regimens]
+        if any(points is None for points in breaks):
+            return None
+        return np.unique(np.concatenate(breaks))
+
+
+def loading_dose(loading, maintenance, tau, start=0, count=None, sigma=1):
+    """
+    Returns a regimen of a loading bolus at start followed by maintenance
+    boluses every tau hours.
+
+    Parameters
+    ----------
+
+    loading: float, required
+        Amount of the loading bolus.
+
+    maintenance: float, required
+        Amount of each maintenance bolus.
+
+    tau: float, required
+        Time between boluses.
+
+    start: float, optional
+        Time of the loading bolus.
+
+    count: None or int, optional
+        Number of maintenance boluses. If None then they repeat
+        indefinitely.
+
+    sigma: float, optional
+        Width of each bolus.
+
+    """
+    return (Bolus([start], [loading], sigma)
+            + RepeatedBolus(maintenance, tau, start + tau, count, sigma))
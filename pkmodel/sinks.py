@@ -0,0 +1,157 @@
+#
+# Result sinks
+#
+import os
+import queue
+import threading
+
+from .storage import save_binary, save_csv
+
+
+class Sink:
+    """
+    A destination for the solutions computed by Solution.analyse_models
+
+    Subclasses implement write, which receives each solved model and its
+    solution in the order of the list of models, and optionally close.
+    Sinks can be used as context managers, closing on exit.
+    """
+
+    def write(self, model, sol):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullSink(Sink):
+    """
+    A sink discarding every solution, for when only the returned list of
+    solutions is needed.
+    """
+
+    def write(self, model, sol):
+        pass
+
+
+class MemorySink(Sink):
+    """
+    A sink keeping every solution in memory
+
+    Attributes
+    ----------
+
+    .solutions: a dict of solution Bunch objects
+        The solutions written to the sink, keyed by model name.
+
+    """
+
+    def __init__(self):
+        self.solutions = {}
+
+    def write(self, model, sol):
+        self.solutions[model.model_args['name']] = sol
+
+
+class FileSink(Sink):
+    """
+    A sink saving each solution to a file named after the model
+
+    Parameters
+    ----------
+
+    directory: None or str or PathLike, optional
+        Directory of the files. If None then the current working directory
+        at the time of writing is used.
+
+    output_format: str, optional
+        'csv' = a .csv file with one row per time step (default)
+        'binary' = a binary columnar directory, see ColumnarWriter
+
+    save: callable, optional
+        Function called as save(time, sol, path, model) to save a solution
+        instead of the default function of output_format.
+
+    """
+
+    def __init__(self, directory=None, output_format='csv', save=None):
+        if output_format not in ('csv', 'binary'):
+            raise ValueError("Not a valid output format. "
+                             "'csv' or 'binary' required")
+
+        self.directory = directory
+        self.output_format = output_format
+        self.save = save
+
+    def write(self, model, sol):
+        directory = os.getcwd() if self.directory is None else self.directory
+        path = os.path.join(directory, model.model_args['name'])
+        if self.save is not None:
+            self.save(sol.t, sol.y, path, model)
+        elif self.output_format == 'binary':
+            save_binary(sol.t, sol.y, path, model, sol.get('compartments'))
+        else:
+            save_csv(sol.t, sol.y, path)
+
+
+class BackgroundSink(Sink):
+    """
+    A sink passing solutions to another sink from a background thread
+
+    Solutions are put on a bounded queue and written by a writer thread,
+    so solving continues while earlier solutions are written. When the
+    queue is full, write blocks until the writer catches up, which bounds
+    the memory held by pending solutions. close waits for every pending
+    solution to be written, closes the wrapped sink and raises the first
+    exception of the writer thread, if any.
+
+    Parameters
+    ----------
+
+    sink: Sink instance, required
+        The sink solutions are written to, e.g. a FileSink.
+
+    maxsize: int, optional
+        Maximum number of solutions waiting to be written.
+
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink, maxsize=16):
+        self.sink = sink
+        self._queue = queue.Queue(maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            if self._error is None:
+                try:
+                    self.sink.write(*item)
+                except Exception as error:
+                    self._error = error
+
+    def write(self, model, sol):
+        if not self._thread.is_alive():
+            raise ValueError("The sink is closed")
+        self._queue.put((model, sol))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self.sink.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -1,11 +1,188 @@
 #
 # Solution class
 #
+import bisect
+import concurrent.futures
+import copy
+import time
+
 import numpy as np
-import scipy.integrate
-import csv as csv
 import os
 
+
+from .propagator import Propagator
+from .storage import save_binary, save_csv
+from .sinks import FileSink
+
+
+class _RHS:
+    # Picklable right hand side of a model with bound arguments, used
+    # in place of a lambda so that integrations can run in a process pool
+    def __init__(self, rhs, args):
+        self.rhs = rhs
+        self.args = args
+
+    def __call__(self, t, y):
+        return self.rhs(t, y, self.args)
+
+
+class _ConstantJacobian:
+    # Picklable callable returning the constant Jacobian of a model
+    def __init__(self, K):
+        self.K = K
+
+    def __call__(self, t, y):
+        return self.K
+
+
+def _result(*args, **fields):
+    # A solution or stats record, as the OptimizeResult that solve_ivp
+    # returns. scipy is only imported once models are solved, so that
+    # importing pkmodel stays cheap
+    from scipy.optimize import OptimizeResult
+    return OptimizeResult(*args, **fields)
+
+
+def _solve_ivp(fun, t_span, y0, method, events=None, count_steps=False,
+               **options):
+    # Calls solve_ivp, also recording the number of accepted steps as
+    # nsteps. Without t_eval the solution holds every step. Otherwise steps
+    # are only counted if count_steps is True, by a non-terminal event,
+    # since events are evaluated once at the start and once per accepted
+    # step; nsteps is None if they are not counted
+    import scipy.integrate
+    events = list(events or [])
+    steps = [-1]
+    counted = count_steps and options.get('t_eval') is not None
+    if counted:
+        def count(t, y):
+            steps[0] += 1
+            return 1.0
+
+        events.append(count)
+
+    sol = scipy.integrate.solve_ivp(fun, t_span, y0, method=method,
+                                    events=events or None, **options)
+    sol.nsteps = None
+    if counted:
+        sol.t_events = sol.t_events[:-1] or None
+        sol.y_events = sol.y_events[:-1] or None
+        sol.nsteps = steps[0]
+    elif options.get('t_eval') is None:
+        sol.nsteps = len(sol.t) - 1
+    return sol
+
+
+class _PiecewiseInterpolant:
+    # Interpolant of a solution integrated in segments starting at the
+    # times starts, right-continuous at the starts. A bolus at the end of
+    # the last segment is added from its time on
+    def __init__(self, starts, interpolants, end=None, jump=None):
+        self.starts = np.asarray(starts, dtype=float)
+        self.interpolants = interpolants
+        self.end = end
+        self.jump = jump
+
+    def __call__(self, t):
+        times = np.atleast_1d(np.asarray(t, dtype=float))
+        segment = np.clip(np.searchsorted(self.starts, times, side='right')
+                          - 1, 0, len(self.starts) - 1)
+        out = None
+        for k, interpolant in enumerate(self.interpolants):
+            inside = segment == k
+            if np.any(inside):
+                y = interpolant(times[inside])
+                if out is None:
+                    out = np.empty((len(y), len(times)))
+                out[:, inside] = y
+        if self.jump is not None:
+            out[:, times >= self.end] += self.jump[:, None]
+        return out[:, 0] if np.ndim(t) == 0 else out
+
+
+class _RowsInterpolant:
+    # Interpolant of the rows [start, stop) of a stacked solution
+    def __init__(self, interpolant, start, stop):
+        self.interpolant = interpolant
+        self.start = start
+        self.stop = stop
+
+    def __call__(self, t):
+        return self.interpolant(t)[self.start:self.stop]
+
+
+class _CompactInterpolant:
+    # Interpolant of the kept compartments of a solution, in its data type
+    def __init__(self, interpolant, rows, dtype):
+        self.interpolant = interpolant
+        self.rows = rows
+        self.dtype = dtype
+
+    def __call__(self, t):
+        return self.interpolant(t)[self.rows].astype(self.dtype, copy=False)
+
+
+def _nbytes(sol):
+    # Memory held by the time points, amounts and sensitivities of a solution
+    nbytes = np.asarray(sol.t).nbytes + np.asarray(sol.y).nbytes
+    if sol.get('sensitivities') is not None:
+        nbytes += np.asarray(sol.sensitivities).nbytes
+    return nbytes
+
+
+# Solution shared by the tasks of a process pool worker
+_worker_solution = None
+
+
+def _init_worker(solution):
+    global _worker_solution
+    _worker_solution = solution
+
+
+def _solve_chunk_worker(indices):
+    # Solves a chunk of models in a worker process. Exceptions are returned
+    # rather than raised so that one failing model does not end the batch
+    try:
+        return [(sol, None) for sol in _worker_solution._solve_chunk(indices)]
+    except Exception as error:
+        if len(indices) == 1:
+            return [(None, error)]
+        # Solve the models of the chunk one by one to isolate the failure
+        results = []
+        for i in indices:
+            results.extend(_solve_chunk_worker([i]))
+        return results
+
+
+def _stop_at_events(sol, events):
+    # Truncates a solution known only at its time points before the first
+    # zero crossing of a terminal event in its direction, estimating the
+    # time of the crossing by linear interpolation between time points
+    stop = None
+    t_events = []
+    for event in events:
+        g = np.array([event(t, y) for t, y in zip(sol.t, sol.y.T)])
+        down = (g[:-1] > 0) & (g[1:] <= 0)
+        up = (g[:-1] < 0) & (g[1:] >= 0)
+        direction = getattr(event, 'direction', 0)
+        crossed = down if direction < 0 else up if direction > 0 else down | up
+        crossings = np.nonzero(crossed)[0]
+        if len(crossings):
+            i = crossings[0]
+            w = g[i] / (g[i] - g[i+1])
+            t_events.append(np.array([sol.t[i] + w * (sol.t[i+1] - sol.t[i])]))
+            stop = i + 1 if stop is None else min(stop, i + 1)
+        else:
+            t_events.append(np.empty(0))
+
+    sol.t_events = t_events
+    if stop is not None:
+        sol.t, sol.y = sol.t[:stop], sol.y[:, :stop]
+        sol.status = 1
+        sol.message = 'A termination event occurred.'
+    return sol
+
+
 class Solution:
     """A Pharmokinetic (PK) model solution
 
@@ -25,10 +202,268 @@ class Solution:
 
         e.g. [[0,0], [1,1]]
 
+    :param engine: None or str, optional.
+
+        Form of the right hand side used for every model. If None then
+        each model's own engine is used, otherwise one of:
+
+        'list' = the right hand side is built from python lists
+        'matrix' = the right hand side is a matrix-vector product with the
+        rate matrix of the model, assembled once per model
+        'generated' = the right hand side and Jacobian are straight-line
+        functions generated per model topology, see Model.make_generated
+        'expm' = the model is propagated exactly between time points with
+        the matrix exponential of its rate matrix, see Propagator. The dose
+        is interpolated between the time points of t_eval.
+
+    Models defined without a dose grid take t_eval as their dose grid, in
+    which case their dose must be given at every time point of t_eval.
+
+    :param method: str, optional.
+
+        Integration method passed to solve_ivp, e.g. 'RK45' (default),
+        'BDF', 'Radau' or 'LSODA'. The implicit methods 'BDF', 'Radau' and
+        'LSODA' are given the analytic Jacobian of each model.
+
+    :param rtol, atol: float, optional.
+
+        Relative and absolute tolerances passed to solve_ivp.
+
+    :param max_step: float, optional.
+
+        Maximum allowed step size passed to solve_ivp.
+
+    :param dose_input: str, optional.
+
+        Interpolation of the dose between time points for the 'expm'
+        engine, 'linear' (default) or 'constant'.
+
+    :param batch: bool, optional.
+
+        If True then models with the same number of compartments and dose
+        type are stacked into one system and solved together in a single
+        solve_ivp call, which removes the per-model overhead for large
+        populations. Steps and error control are then shared by the whole
+        stack, and doses are interpolated between the time points of
+        t_eval unless all models of the stack share one dose grid. Not
+        used by the 'expm' engine, nor with impulse_doses.
+
+    :param impulse_doses: bool, optional.
+
+        If True then the boluses of models dosed by a Regimen are applied as
+        discrete events: the model is integrated smoothly between bolus
+        times, and each bolus amount is added to the first compartment (q_c
+        for 'iv', q_0 for 'sc') at its time, instead of being smoothed into
+        a narrow Gaussian dose.
+
+    :param dense_output: bool, optional.
+
+        If True then each solution keeps an interpolant as 'sol', a callable
+        giving the amounts at any time or array of times within t_eval[0]
+        and t_eval[-1], see sample. The solution then only holds the steps
+        taken by solve_ivp rather than every time point of t_eval. For the
+        'expm' engine the interpolant is the exact solution between the time
+        points of t_eval, see PropagatorInterpolant.
+
+    :param stop_conditions: None or list of StopCondition instances, optional.
+
+        Conditions ending the integration of a model early, e.g.
+        BelowThreshold for washout studies or Plateau for titration runs.
+        They are passed to solve_ivp as terminal events, and checked at the
+        time points of t_eval by the 'expm' engine. A stopped solution holds
+        only the time points before the stop, and records the time of the
+        stop as stop_time and the reason of the first condition reached as
+        stop_reason; both are None for a solution that was not stopped. Not
+        used with batch.
+
+    :param processes: None or int, optional.
+
+        If None (default) then models are solved serially. Otherwise models
+        are solved in a pool of this many processes, in chunks of chunksize
+        models (one stack per chunk in batch mode). The order of the solutions
+        does not depend on the pool. A model that fails to solve does not stop
+        the others: its solution is None and the exception is recorded in the
+        errors attribute.
+
+    :param chunksize: int, optional.
+
+        Number of models per task of the process pool.
+
+    :param output_format: str, optional.
+
+        Format of the solution files saved by analyse_models:
+
+        'csv' = a .csv file with one row per time step (default)
+        'binary' = a directory with one binary column per compartment and
+        the dose type, compartment names and model arguments as metadata,
+        see ColumnarWriter
+
+    :param sink: None or Sink instance, optional.
+
+        Destination of the solutions computed by analyse_models, e.g.
+        NullSink (no output), MemorySink, FileSink or a BackgroundSink
+        writing from a separate thread while solving continues. If None
+        (default) then solutions are saved in the current working directory
+        in output_format. Sinks are not closed by analyse_models.
+
+    :param cache: None or SolutionCache instance, optional.
+
+        Cache of solutions looked up before solving each model, in the
+        calling process. Models whose solution is cached are not solved
+        again, and the solutions of the others are added to the cache.
+        Models with a dose that cannot be hashed, such as a lambda, are
+        always solved.
+
+    :param sensitivities: bool, optional.
+
+        If True then the sensitivities dq/dtheta of the amounts to every
+        parameter theta of the model (in the order of
+        Model.parameter_names) are integrated with the amounts in the same
+        solve, as the linear system of Model.make_sensitivity_matrix. Each
+        solution then has the fields 'parameters' (the parameter names) and
+        'sensitivities' (an array of shape (parameters, compartments, time
+        points)). The matrix form of the right hand side is used whatever
+        the engine, except for 'expm', which propagates the augmented system
+        exactly. Not used with batch nor incremental.
+
+    :param incremental: bool, optional.
+
+        If True then the solution of each model is kept as a checkpoint,
+        keyed by model name, and solving a model of the same name again
+        resumes from the last time point of t_eval before which neither its
+        dose schedule nor t_eval changed, e.g. after a later dose is edited
+        or t_end is extended. The new trajectory is spliced onto the kept
+        one. Models are solved from the start whenever anything else
+        changed: their parameters, initial conditions or the solver
+        settings. Changes of the dose are detected on the dose grids and
+        time points of both solves, the breakpoints of regimens (see
+        Regimen.breakpoints) and the bolus events with impulse_doses; doses
+        given by other callables are always solved from the start. A model
+        solved again without any change returns its checkpoint. Only
+        serial, non-batched solves without dense_output are resumed.
+
+    :param compartments: None or list of int, optional.
+
+        Indices in the state vector of the compartments kept in each
+        solution, e.g. [0] for the central compartment of 'iv' models. If
+        None (default) then every compartment is kept. Models are still
+        solved with all their compartments. Solutions record the kept
+        indices as 'compartments'.
+
+    :param dtype: None or str or numpy dtype, optional.
+
+        Floating point data type of the amounts (and sensitivities) kept in
+        each solution, e.g. 'float32', which halves their memory and output
+        size. Models are always solved in double precision. Time points are
+        kept in double precision in memory; binary output stores every
+        column in dtype. If None (default) then amounts are kept as solved.
+
+    :param decimate: int, optional.
+
+        Keeps every decimate-th time point of each solution, and its last,
+        so that the output grid is coarser than the grid the models are
+        solved on. Defaults to 1, every time point.
+
+    The storage kept for each model is recorded in its stats, and the total
+    reduction by compartments, dtype and decimate in report.
+
+    :param count_steps: bool, optional.
+
+        If True then the accepted steps of solve_ivp are counted as nsteps
+        in the stats of each solution. Steps are counted by an event checked
+        at every step, so they are only counted on request, except with
+        dense_output, where the solution holds every step.
+
+    :param callback: None or callable, optional.
+
+        Function called as callback(model, stats) in the calling process as
+        soon as each model is solved, with the stats record of its solution
+        (see stats), e.g. to flag costly or stiff parameter sets.
+
+    Attributes
+    ----------
+
+    .errors: a dict of exceptions
+        Exceptions raised while solving models in a process pool, keyed
+        by the index of the model in the list of models.
+
+    .stats: a list of stats records
+        Solver statistics of each model of the last solve, in the order of
+        the list of models (None for models that failed to solve), also
+        attached to each solution as sol.stats. Each record has fields
+
+        'name' = name of the model
+        'engine', 'method' = engine and solve_ivp method used ('method' is
+        None for the 'expm' engine)
+        'wall_time' = wall time of the solve in seconds
+        'nfev', 'njev', 'nlu' = right hand side and Jacobian evaluations and
+        LU decompositions, see solve_ivp
+        'nexpm' = matrix exponentials computed by the 'expm' engine, None
+        for the other engines
+        'nsteps' = accepted steps of solve_ivp, None unless count_steps or
+        dense_output is True, or propagation intervals of the 'expm' engine
+        'status', 'success' = status of the solve, see solve_ivp
+        'stack_size' = number of models solved together in batch mode,
+        whose stats are those of the whole stack
+        'cached' = True if the solution was found in the cache, in which
+        case wall_time is the time of the lookup and the other fields are
+        those of the original solve
+        'resumed_at' = time from which an incremental solve resumed, whose
+        other fields are those of the resumed part, or None
+        'nbytes', 'full_nbytes' = bytes of the time points, amounts and
+        sensitivities kept in the solution, and before compartments, dtype
+        and decimate were applied
+
+    See report for statistics aggregated over all models.
+
     """
 
     
-    def __init__(self, list_of_models, t_eval, y0):
+    def __init__(self, list_of_models, t_eval, y0, engine=None,
+                 method='RK45', rtol=1e-3, atol=1e-6, max_step=np.inf,
+                 dose_input='linear', batch=False, processes=None,
+                 chunksize=1, output_format='csv', sink=None,
+                 impulse_doses=False, stop_conditions=None, callback=None,
+                 dense_output=False, cache=None, incremental=False,
+                 sensitivities=False, compartments=None, dtype=None,
+                 decimate=1, count_steps=False):
+        if engine not in (None, 'list', 'matrix', 'generated', 'expm'):
+            raise ValueError("Not a valid engine. "
+                             "'list', 'matrix', 'generated' or 'expm' required")
+
+        if dose_input not in ('linear', 'constant'):
+            raise ValueError("Not a valid dose input. "
+                             "'linear' or 'constant' required")
+
+        if output_format not in ('csv', 'binary'):
+            raise ValueError("Not a valid output format. "
+                             "'csv' or 'binary' required")
+
+        if batch and impulse_doses:
+            raise ValueError("Batched solves do not support impulse doses")
+
+        if batch and stop_conditions:
+            raise ValueError("Batched solves do not support stop conditions")
+
+        if sensitivities and (batch or incremental):
+            raise ValueError("Sensitivities are not supported by batched "
+                             "nor incremental solves")
+
+        if dtype is not None and not np.issubdtype(np.dtype(dtype),
+                                                   np.floating):
+            raise ValueError("Not a valid dtype. A floating point type "
+                             "required")
+
+        if int(decimate) != decimate or decimate < 1:
+            raise ValueError("decimate must be a positive integer")
+
+        if compartments is not None:
+            compartments = [int(i) for i in compartments]
+            for model in list_of_models:
+                if not all(0 <= i < model.components for i in compartments):
+                    raise ValueError("Not valid compartments for %s"
+                                     % model.model_args['name'])
+
         n = 0
         for model in list_of_models:
             if len(y0[n]) != model.components:
@@ -38,36 +473,477 @@ class Solution:
         self.models = list_of_models
         self.y0 = y0
         self.t_eval = t_eval
+        self.engine = engine
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.dose_input = dose_input
+        self.batch = batch
+        self.processes = processes
+        self.chunksize = chunksize
+        self.output_format = output_format
+        self.sink = sink
+        self.impulse_doses = impulse_doses
+        self.stop_conditions = list(stop_conditions or [])
+        self.callback = callback
+        self.dense_output = dense_output
+        self.cache = cache
+        self.incremental = incremental
+        self.sensitivities = sensitivities
+        self.compartments = compartments
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.decimate = int(decimate)
+        self.count_steps = count_steps
+        self._checkpoints = {}
+        self.errors = {}
+        self.stats = []
+
+
+    def __getstate__(self):
+        # Sinks, callbacks and caches stay in the process that created them
+        state = self.__dict__.copy()
+        state['sink'] = None
+        state['callback'] = None
+        state['cache'] = None
+        state['_checkpoints'] = {}
+        return state
 
     
-    def analyse_models(self):
+    def analyse_models(self, keep=True):
         """
         Computes a solution of each model specified in the list of models.
-        The solution data for each model is saved as a csv in the current working directory.
+        The solution data for each model is saved as a csv (or binary, see
+        output_format) in the current working directory, or written to the
+        sink of the solution as soon as it is computed.
+
+        Parameters
+        ----------
+
+        keep: bool, optional
+            If False then solutions are only written to the sink and not
+            kept, so that only one solution is held in memory at a time,
+            e.g. with a MetricsSink.
 
         Returns
         -------
 
         :return sol_list: a list of solution Bunch objects with defined fields.
             Time points are defined as 't' and values of solution are defined as 'y'.
+            If keep is False then an empty list.
+
+        """
+        sink = self.sink
+        if sink is None:
+            sink = FileSink(os.getcwd(), self.output_format, save=self._save)
+
+        sol_list = []
+        for model, sol in zip(self.models, self._iter_solutions()):
+            if keep:
+                sol_list.append(sol)
+            if sol is not None:
+                sink.write(model, sol)
+        return sol_list
+
+
+    def _save(self, time, sol, save_file_path, model):
+        # Saves a solution in the output format of the solution
+        if self.output_format == 'binary':
+            self._save_to_binary(time, sol, save_file_path, model)
+        else:
+            self._save_to_csv(time, sol, save_file_path)
+
+
+    def _solve_models(self):
+        """
+        Computes a solution of each model specified in the list of models,
+        in the order of the list, without saving them.
+        """
+        return list(self._iter_solutions())
+
 
+    def sample(self, sol_list, times):
         """
+        Evaluates solutions computed with dense_output at arbitrary times,
+        e.g. clinical sampling times, without solving the models again.
+
+        Parameters
+        ----------
+
+        sol_list: list of solution Bunch objects, required.
+            Solutions returned by analyse_models. None entries, for models
+            that failed to solve, are kept as None.
+
+        times: float or array_like, required.
+            Times at which to evaluate the solutions.
+
+        Returns
+        -------
+
+        :return samples: a list with, for each solution, the amounts of drug
+            in every compartment at the times, one row per compartment.
+
+        """
+        samples = []
+        for sol in sol_list:
+            if sol is not None and sol.get('sol') is None:
+                raise ValueError("The solution was not computed with "
+                                 "dense_output")
+            samples.append(None if sol is None else sol.sol(times))
+        return samples
+
+
+    def report(self, slowest=5):
+        """
+        Returns solver statistics of the last solve aggregated over all
+        models, see stats.
+
+        Parameters
+        ----------
+
+        slowest: int, optional.
+            Number of slowest models to list.
+
+        Returns
+        -------
+
+        :return report: a Bunch object with fields 'models' (number of
+            models), 'failed' (models without a solution or whose solve was
+            unsuccessful), 'wall_time', 'nfev', 'njev', 'nlu', 'nexpm' and
+            'nsteps' (summed over models with known values),
+            'nbytes' and 'full_nbytes' (summed over models),
+            'storage_reduction' (full_nbytes / nbytes, the reduction by
+            compartments, dtype and decimate) and 'slowest' (names of the
+            slowest models, slowest first).
+
+        """
+        stats = [record for record in self.stats if record is not None]
+        report = _result(models=len(self.stats))
+        report.failed = len(self.stats) - sum(record.success
+                                              for record in stats)
+        for key in ('wall_time', 'nfev', 'njev', 'nlu', 'nexpm', 'nsteps',
+                    'nbytes', 'full_nbytes'):
+            report[key] = sum(record[key] for record in stats
+                              if record.get(key) is not None)
+        report.storage_reduction = (report.full_nbytes / report.nbytes
+                                    if report.nbytes else 1.0)
+        stats.sort(key=lambda record: record.wall_time, reverse=True)
+        report.slowest = [record.name for record in stats[:slowest]]
+        return report
+
+
+    def _iter_solutions(self):
+        # Yields the solution of each model in the order of the list of
+        # models, as soon as it is computed, recording its stats
+        self.stats = []
+        for model, sol in zip(self.models, self._iter_cached()):
+            stats = None if sol is None else sol.stats
+            self.stats.append(stats)
+            if self.callback is not None and stats is not None:
+                self.callback(model, stats)
+            yield sol
+
+
+    def _iter_cached(self):
+        # Yields the solution of each model in the order of the list of
+        # models, from the cache if possible
+        indices = list(range(len(self.models)))
+        if self.cache is None:
+            yield from self._iter_chunks(indices)
+            return
+
+        # Models repeated in the list are solved once, as their first
+        # occurrence
+        keys, cached, repeated, first = [], {}, {}, {}
+        for i in indices:
+            start = time.perf_counter()
+            key = self.cache.key(self.models[i], self.y0[i], self)
+            keys.append(key)
+            if key in first:
+                repeated[i] = first[key]
+                continue
+            sol = None if key is None else self.cache.get(key)
+            if sol is not None:
+                sol.stats = _result(sol.stats, cached=True,
+                                    name=self.models[i].model_args['name'],
+                                    wall_time=time.perf_counter() - start)
+                cached[i] = sol
+            elif key is not None:
+                first[key] = i
+
+        misses = self._iter_chunks([i for i in indices
+                                    if i not in cached and i not in repeated])
+        solved = {}
+        for i in indices:
+            if i in cached:
+                yield cached[i]
+                continue
+            if i in repeated:
+                sol = solved[repeated[i]]
+                if sol is not None:
+                    sol = _result(sol)
+                    sol.stats = _result(sol.stats, cached=True,
+                                        name=self.models[i].model_args['name'],
+                                        wall_time=0.0)
+                yield sol
+                continue
+            sol = next(misses)
+            if sol is not None and keys[i] is not None:
+                self.cache.put(keys[i], sol)
+            solved[i] = sol
+            yield sol
+
+
+    def _iter_chunks(self, indices):
+        # Yields the solution of each model at the given indices of the list
+        # of models, in order, solving them serially or in a process pool
+        if not indices:
+            return
+        if self.processes is None:
+            if self.batch and self.engine != 'expm':
+                yield from self._solve_chunk(indices)
+            else:
+                for i in indices:
+                    yield from self._solve_chunk([i])
+            return
+
+        chunks = [indices[i:i + self.chunksize]
+                  for i in range(0, len(indices), self.chunksize)]
+        self.errors = {}
         count = 0
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_worker,
+                initargs=(self,)) as executor:
+            for results in executor.map(_solve_chunk_worker, chunks):
+                for sol, error in results:
+                    if error is not None:
+                        self.errors[indices[count]] = error
+                    count += 1
+                    yield sol
+
+
+    def _solve_chunk(self, indices):
+        # Solves the models at the given indices of the list of models
+        if self.batch and self.engine != 'expm':
+            sol_list = self._integrate_batch([self.models[i] for i in indices],
+                                             [self.y0[i] for i in indices])
+            return [self._compact(sol) for sol in sol_list]
+
         sol_list = []
-        for model in self.models:
+        for count in indices:
+            model = self.models[count]
             # Get arguments of the model using Model's make_arg methods
             args = model.make_args()
             # Create a 1D array of initial conditions for the evaluated model
             y0 = np.array(self.y0[count])
-            sol = self._integrate(model,args,y0)
-            sol_list.append(sol)
-            count += 1
-            path = os.path.join(os.getcwd(),model.model_args['name'])
-            self._save_to_csv(sol.t,sol.y,path)
+            start = time.perf_counter()
+            if self.incremental:
+                sol = self._resume(model, args, y0)
+            else:
+                sol = self._integrate(model,args,y0)
+            sol.stats = self._stats(model, sol, time.perf_counter() - start)
+            sol_list.append(self._compact(sol))
         return sol_list
+
+
+    def _compact(self, sol):
+        # Keeps the compartments and time points of the output of a
+        # solution, in its data type, recording the bytes kept. The solution
+        # itself is not modified, as it may be an incremental checkpoint
+        full_nbytes = _nbytes(sol)
+        if (self.compartments is not None or self.dtype is not None
+                or self.decimate > 1):
+            sol = _result(sol)
+            rows = slice(None) if self.compartments is None \
+                else self.compartments
+            points = slice(None)
+            if self.decimate > 1 and len(sol.t):
+                points = np.arange(0, len(sol.t), self.decimate)
+                if points[-1] != len(sol.t) - 1:
+                    points = np.append(points, len(sol.t) - 1)
+            dtype = sol.y.dtype if self.dtype is None else self.dtype
+
+            # New arrays, so that the full solution can be freed
+            sol.t = np.array(sol.t[points])
+            sol.y = np.array(sol.y[rows][:, points], dtype=dtype)
+            if sol.get('sensitivities') is not None:
+                sol.sensitivities = np.array(
+                    sol.sensitivities[:, rows][:, :, points], dtype=dtype)
+            if sol.get('sol') is not None:
+                sol.sol = _CompactInterpolant(sol.sol, rows, dtype)
+            if self.compartments is not None:
+                sol.compartments = list(self.compartments)
+        sol.stats.nbytes = _nbytes(sol)
+        sol.stats.full_nbytes = full_nbytes
+        return sol
+
+
+    def _stats(self, model, sol, wall_time, stack_size=1):
+        # Stats record of a solution, see the stats attribute
+        engine = self.engine if self.engine is not None else model.engine
+        return _result(name=model.model_args['name'], engine=engine,
+                       method=None if engine == 'expm' else self.method,
+                       wall_time=wall_time, nfev=sol.nfev, njev=sol.njev,
+                       nlu=sol.nlu, nexpm=sol.get('nexpm'),
+                       nsteps=sol.get('nsteps'), status=sol.status,
+                       success=sol.success, stack_size=stack_size,
+                       cached=False, resumed_at=sol.get('resumed_at'))
+
+
+    def _settings(self):
+        # Solver settings that a checkpoint must share to be resumed
+        return (self.engine, self.method, self.rtol, self.atol,
+                self.max_step, self.dose_input, self.impulse_doses,
+                self.dense_output, tuple(self.stop_conditions))
+
+
+    def _resume(self, model, args, y0):
+        """
+        Solves a PK model, resuming from the checkpoint of the last solve
+        of a model of the same name if only later doses or time points
+        changed, and keeps the solution as the new checkpoint.
+
+        Parameters
+        ----------
+
+        model: Model class instance, required.
+            A Pharmokinetic model.
+
+        args: list, required.
+            A list of parameters of the Pharmokinetic model.
+
+        y0: array_like, required.
+            Initial amount of drug in all compartments.
+
+        Returns
+        -------
+
+        sol: Bunch object with defined time points and values of solution,
+            and the time from which it was resumed as 'resumed_at' (None if
+            it was solved from the start).
+
+        """
+        model = self._with_dose_grid(model)
+        t_eval = np.asarray(self.t_eval, dtype=float)
+        name = model.model_args['name']
+        checkpoint = self._checkpoints.get(name)
+        k = 0
+        if checkpoint is not None:
+            k = self._resume_index(checkpoint, model, args, y0, t_eval)
+
+        if k > 0 and k == len(t_eval) - 1:
+            # Nothing changed up to the end: the checkpoint is returned
+            old = checkpoint['sol']
+            sol = _result(old, t=old.t[:k + 1], y=old.y[:, :k + 1], nfev=0,
+                          njev=0, nlu=0, nsteps=0)
+            if old.get('nexpm') is not None:
+                sol.nexpm = 0
+            sol.resumed_at = float(t_eval[k])
+        elif k > 0:
+            old = checkpoint['sol']
+            sol = self._integrate(model, args, old.y[:, k], t_eval[k:],
+                                  resumed=True)
+            if sol.success:
+                sol.t = np.concatenate([old.t[:k], sol.t])
+                sol.y = np.hstack([old.y[:, :k], sol.y])
+            sol.resumed_at = float(t_eval[k])
+        else:
+            sol = self._integrate(model, args, y0)
+            sol.resumed_at = None
+
+        self._checkpoints[name] = {'model': copy.deepcopy(model),
+                                   'args': copy.deepcopy(args),
+                                   'y0': np.array(y0, dtype=float),
+                                   't_eval': t_eval.copy(),
+                                   'settings': self._settings(),
+                                   'sol': sol}
+        return sol
+
+
+    def _resume_index(self, checkpoint, model, args, y0, t_eval):
+        # Index of the last time point of t_eval at which the solution of
+        # the checkpoint still holds, or 0 if it cannot be resumed
+        old = checkpoint['sol']
+        t_old = checkpoint['t_eval']
+        if (self.dense_output or not old.success or old.status != 0
+                or len(old.t) != len(t_old)
+                or checkpoint['settings'] != self._settings()):
+            return 0
+
+        previous = checkpoint['model']
+        if ((previous.components, previous.dose_type)
+                != (model.components, model.dose_type)
+                or checkpoint['args'] != args
+                or not np.array_equal(checkpoint['y0'], y0)):
+            return 0
+
+        # Time points shared by both solves
+        n = min(len(t_old), len(t_eval))
+        differ = np.nonzero(t_old[:n] != t_eval[:n])[0]
+        m = differ[0] if len(differ) else n
+        if m < 2:
+            return 0
+
+        t_limit = self._dose_agreement(previous, model, t_old, t_eval)
+        if t_limit is None:
+            return 0
+        return int(np.searchsorted(t_eval[:m], t_limit, side='right')) - 1
+
+
+    def _dose_agreement(self, old, new, t_old, t_eval):
+        # Last time up to which the doses of two models agree, or None if
+        # they differ from the start. Doses are compared at the time points
+        # and dose grids of both, between which they are linear, and at the
+        # breakpoints of regimens. Other callable doses are never resumed
+        t_end = min(t_old[-1], t_eval[-1])
+        points = [t_old, t_eval, old.dose_grid, new.dose_grid]
+        for model in (old, new):
+            if callable(model.dose_t):
+                breakpoints = getattr(model.dose_t, 'breakpoints', None)
+                breakpoints = (None if breakpoints is None
+                               else breakpoints(t_eval[0], t_end))
+                if breakpoints is None:
+                    return None
+                points.append(breakpoints)
+        points = np.concatenate(points)
+        t_change = np.inf
+        if self.impulse_doses:
+            old, new = copy.copy(old), copy.copy(new)
+            old.impulse_doses = new.impulse_doses = True
+            events = []
+            for model in (old, new):
+                times, amounts = model.bolus_events(t_eval[0], t_end)
+                times, index = np.unique(times, return_inverse=True)
+                events.append(dict(zip(times.tolist(),
+                                       np.bincount(index, weights=amounts)
+                                       .tolist())))
+            changed = [t for t in set(events[0]) | set(events[1])
+                       if events[0].get(t) != events[1].get(t)]
+            if changed:
+                t_change = min(changed)
+            points = np.concatenate([points, list(events[0]),
+                                     list(events[1])])
+
+        points = np.unique(points)
+        points = points[(points >= t_eval[0]) & (points <= t_end)]
+        differ = (np.asarray(old.dose(points)) != np.asarray(new.dose(points))) \
+            | (points >= t_change)
+        j = np.argmax(differ) if np.any(differ) else len(points)
+        return points[j - 1] if j > 0 else None
     
     
-    def _integrate(self, model,args, y0):
+    def _with_dose_grid(self, model):
+        # The model itself if it has a dose grid, otherwise a copy of the
+        # model whose dose grid is t_eval, leaving the model of the caller
+        # free to be solved on other time points
+        if model.dose_grid is not None:
+            return model
+        model = copy.copy(model)
+        model.set_dose_grid(self.t_eval)
+        return model
+
+
+    def _integrate(self, model,args, y0, t_eval=None, resumed=False):
         """
         Numerically integrates a provided PK model using scipy's solve_ivp
 
@@ -79,6 +955,17 @@ class Solution:
         
         args: list, required.
             A list of parameters of the Pharmokinetic model.
+
+        y0: array_like, required.
+            Initial amount of drug in all compartments.
+
+        t_eval: array_like, optional.
+            Time points of the solution, defaults to the t_eval of the
+            solution.
+
+        resumed: bool, optional.
+            If True then y0 already includes the boluses given at t_eval[0],
+            as a solution resumed from a checkpoint does.
         
         Returns
         -------
@@ -87,14 +974,326 @@ class Solution:
             Refer to scipy's solve_ivp documentation
 
         """
+        model = self._with_dose_grid(model)
+        if t_eval is None:
+            t_eval = self.t_eval
 
-        sol = scipy.integrate.solve_ivp(fun =  lambda t, y: model.rhs(t, y, args),
-         t_span = [self.t_eval[0], self.t_eval[-1]],
-         y0 = y0, t_eval = self.t_eval)
-         
+        if self.sensitivities:
+            # Sensitivities start from zero, as y0 is not a parameter
+            n = model.components
+            y0 = np.concatenate([y0, np.zeros(n * len(model.parameter_names()))])
+            sol = self._integrate_state(model, args, y0, t_eval, resumed)
+            return self._split_sensitivities(model, sol)
+
+        return self._integrate_state(model, args, y0, t_eval, resumed)
+
+
+    def _integrate_state(self, model, args, y0, t_eval, resumed):
+        # Integrates the state of a model (augmented with sensitivities if
+        # sensitivities is True), see _integrate
+        if self.impulse_doses:
+            # Boluses are applied as impulses between smooth segments
+            model = copy.copy(model)
+            model.impulse_doses = True
+            times, amounts = model.bolus_events(t_eval[0], t_eval[-1])
+            if resumed:
+                keep = times > t_eval[0]
+                times, amounts = times[keep], amounts[keep]
+            if len(times):
+                sol = self._integrate_segments(self._solver(model, args),
+                                               y0, times, amounts, t_eval)
+                return self._record_stop(sol)
+
+        return self._record_stop(self._solver(model, args)(t_eval, y0))
+
+
+    def _split_sensitivities(self, model, sol):
+        # Splits the augmented state of a solution into the amounts y and
+        # the sensitivities
+        n = model.components
+        parameters = model.parameter_names()
+        sol.parameters = parameters
+        sol.sensitivities = sol.y[n:].reshape(len(parameters), n, -1)
+        sol.y = sol.y[:n]
+        if sol.get('sol') is not None:
+            sol.sol = _RowsInterpolant(sol.sol, 0, n)
+        if sol.get('y_events'):
+            sol.y_events = [y[:, :n] for y in sol.y_events]
         return sol
+
+
+    def _record_stop(self, sol):
+        # Records the time and reason of the first stop condition reached
+        sol.stop_time, sol.stop_reason = None, None
+        for condition, t_events in zip(self.stop_conditions,
+                                       sol.get('t_events') or []):
+            if len(t_events) and (sol.stop_time is None
+                                  or t_events[0] < sol.stop_time):
+                sol.stop_time = float(t_events[0])
+                sol.stop_reason = condition.reason
+        return sol
+
+
+    def _solver(self, model, args):
+        # Returns a function solving the model from the state y0 at t[0]
+        # and returning the solution at the time points t
+        engine = self.engine if self.engine is not None else model.engine
+        events = [condition.event(model, args)
+                  for condition in self.stop_conditions]
+        if engine == 'expm':
+            K = (model.make_sensitivity_matrix(args) if self.sensitivities
+                 else model.make_matrix(args))
+            propagator = Propagator(K, self.dose_input)
+
+            def solve(t, y0):
+                sol = propagator.propagate(t, y0, model.dose(t),
+                                           self.dense_output)
+                sol.nsteps = len(t) - 1
+                return _stop_at_events(sol, events) if events else sol
+
+            return solve
+
+        implicit = self.method in ('BDF', 'Radau', 'LSODA')
+        jac = None
+        if self.sensitivities:
+            # The augmented system only has a matrix form
+            engine = 'matrix'
+            K = model.make_sensitivity_matrix(args)
+        elif engine == 'generated':
+            fun, jac = model.make_generated(args)
+            K = jac(self.t_eval[0], None)
+        elif engine == 'matrix' or implicit:
+            # Assemble the rate matrix once for the whole integration
+            K = model.jacobian(self.t_eval[0], None, args)
+
+        if engine == 'matrix':
+            fun = _RHS(model.rhs_matrix, K)
+        elif engine != 'generated':
+            fun = _RHS(model.rhs, args)
+
+        options = {}
+        if implicit:
+            # The Jacobian is constant, LSODA only accepts a callable
+            if self.method == 'LSODA':
+                options['jac'] = jac if jac is not None else _ConstantJacobian(K)
+            else:
+                options['jac'] = K
+
+        if self.dense_output:
+            # Keep the steps and interpolant of the solver only
+            options['dense_output'] = True
+
+        def solve(t, y0):
+            return _solve_ivp(fun = fun,
+             t_span = [t[0], t[-1]],
+             y0 = y0, t_eval = None if self.dense_output else t,
+             method = self.method,
+             rtol = self.rtol, atol = self.atol, max_step = self.max_step,
+             events = events, count_steps = self.count_steps, **options)
+
+        return solve
+
+
+    def _integrate_segments(self, solve, y0, times, amounts, t_eval=None):
+        """
+        Solves a PK model between bolus events, adding each bolus amount
+        to the first compartment (q_c for 'iv', q_0 for 'sc') at its time.
+        Solutions are right-continuous: at the time of a bolus they include
+        it.
+
+        Parameters
+        ----------
+
+        solve: callable, required.
+            Function solving the model from a state at t[0] over the time
+            points t, see _solver.
+
+        y0: array_like, required.
+            Initial amount of drug in all compartments.
+
+        times, amounts: array_like, required.
+            Times and amounts of the boluses.
+
+        t_eval: array_like, optional.
+            Time points of the solution, defaults to the t_eval of the
+            solution.
+
+        Returns
+        -------
+
+        sol: Bunch object with defined time points and values of solution.
+
+        """
+        t_eval = np.asarray(self.t_eval if t_eval is None else t_eval,
+                            dtype=float)
+        t_start, t_end = t_eval[0], t_eval[-1]
+
+        # Boluses at the same time are given together
+        times, index = np.unique(times, return_inverse=True)
+        amounts = np.bincount(index, weights=amounts)
+        jumps = dict(zip(times.tolist(), amounts.tolist()))
+
+        y = np.array(y0, dtype=float)
+        y[0] += jumps.get(t_start, 0.0)
+        bounds = ([t_start] + [t for t in times.tolist() if t_start < t < t_end]
+                  + [t_end])
+
+        t_out, y_out, interpolants = [], [], []
+        stats = {'nfev': 0, 'njev': 0, 'nlu': 0, 'nexpm': 0, 'nsteps': 0}
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            last = b == t_end
+            points = t_eval[(t_eval >= a) & ((t_eval < b) | last)]
+            t_segment = np.unique(np.concatenate([[a], points, [b]]))
+            sol = solve(t_segment, y)
+            if not sol.success:
+                return sol
+
+            if self.dense_output:
+                # Keep every step, the end of a segment being the start of
+                # the next
+                keep = np.arange(len(sol.t)) < len(sol.t) - 1 + last
+                interpolants.append(sol.sol)
+            else:
+                keep = np.isin(sol.t, points)
+            t_out.append(sol.t[keep])
+            y_out.append(sol.y[:, keep])
+            for key in stats:
+                if stats[key] is not None and sol.get(key) is not None:
+                    stats[key] += sol[key]
+                else:
+                    stats[key] = None
+
+            if sol.status == 1:
+                # A stop condition was reached within the segment
+                dense = (_PiecewiseInterpolant(bounds[:len(interpolants)],
+                                               interpolants)
+                         if self.dense_output else None)
+                return _result(t=np.concatenate(t_out),
+                               y=np.hstack(y_out), sol=dense,
+                               t_events=sol.t_events,
+                               y_events=sol.y_events, status=1,
+                               message=sol.message, success=True,
+                               **stats)
+
+            y = sol.y[:, -1].copy()
+            y[0] += jumps.get(b, 0.0)
+
+        t_out = np.concatenate(t_out)
+        y_out = np.hstack(y_out)
+        dense = None
+        if self.dense_output:
+            jump = None
+            if t_end in jumps:
+                jump = np.zeros(len(y))
+                jump[0] = jumps[t_end]
+            dense = _PiecewiseInterpolant(bounds[:-1], interpolants, t_end,
+                                          jump)
+        if t_end in jumps:
+            y_out[0, -1] += jumps[t_end]
+
+        return _result(t=t_out, y=y_out, sol=dense, t_events=None,
+                       y_events=None, status=0,
+                       message='The solver successfully reached the end '
+                       'of the integration interval.',
+                       success=True, **stats)
     
     
+    def _integrate_batch(self, models, y0s):
+        """
+        Numerically integrates a list of PK models with scipy's solve_ivp,
+        stacking the models that share a topology into one system.
+
+        Parameters
+        ----------
+
+        models: list of Model class instances, required.
+            Pharmokinetic models.
+
+        y0s: list of list objects, required.
+            Initial conditions of each model.
+
+        Returns
+        -------
+
+        sol_list: a list of Bunch objects with defined time points and values
+            of solution of each model, in the order of models.
+
+        """
+        groups = {}
+        for i, model in enumerate(models):
+            groups.setdefault((model.components, model.dose_type), []).append(i)
+
+        sol_list = [None] * len(models)
+        for (n, dose_type), indices in groups.items():
+            group = [models[i] for i in indices]
+            y0 = np.concatenate([np.asarray(y0s[i], dtype=float)
+                                 for i in indices])
+            start = time.perf_counter()
+            sol = self._integrate_stack(group, y0)
+            wall_time = time.perf_counter() - start
+
+            # Split the stacked solution back into one solution per model
+            for k, i in enumerate(indices):
+                fields = dict(sol)
+                fields['y'] = sol.y[k*n:(k+1)*n]
+                if sol.sol is not None:
+                    fields['sol'] = _RowsInterpolant(sol.sol, k*n, (k+1)*n)
+                sol_list[i] = _result(**fields)
+                sol_list[i].stats = self._stats(models[i], sol, wall_time,
+                                                len(indices))
+
+        return sol_list
+
+
+    def _integrate_stack(self, models, y0):
+        # Solves models with the same topology as one block diagonal system
+        models = [self._with_dose_grid(model) for model in models]
+
+        m, n = len(models), models[0].components
+
+        import scipy.sparse
+
+        # Block diagonal rate matrix of the stacked system
+        blocks = np.stack([model.make_matrix() for model in models])
+        offsets = (np.arange(m) * n)[:, None, None]
+        rows = offsets + np.arange(n)[None, :, None] + np.zeros((1, 1, n), int)
+        cols = offsets + np.arange(n)[None, None, :] + np.zeros((1, n, 1), int)
+        K = scipy.sparse.csr_matrix((blocks.ravel(),
+                                     (rows.ravel(), cols.ravel())),
+                                    shape=(m*n, m*n))
+
+        # Dose table of every model over a common grid
+        grid = models[0].dose_grid
+        if not all(np.array_equal(model.dose_grid, grid) for model in models):
+            grid = np.asarray(self.t_eval, dtype=float)
+        doses = np.stack([model.dose(grid) for model in models], axis=1)
+        times = grid.tolist()
+
+        def fun(t, y):
+            i = min(max(bisect.bisect_right(times, t) - 1, 0), len(times) - 2)
+            w = min(max((t - times[i]) / (times[i+1] - times[i]), 0.0), 1.0)
+            dy = K.dot(y)
+            dy[::n] += (1 - w) * doses[i] + w * doses[i+1]
+            return dy
+
+        options = {}
+        if self.method in ('BDF', 'Radau'):
+            options['jac'] = K
+        elif self.method == 'LSODA':
+            # The Jacobian is block diagonal, hence banded
+            options['lband'] = options['uband'] = n - 1
+
+        if self.dense_output:
+            options['dense_output'] = True
+
+        return _solve_ivp(fun = fun,
+         t_span = [self.t_eval[0], self.t_eval[-1]],
+         y0 = y0, t_eval = None if self.dense_output else self.t_eval,
+         method = self.method,
+         rtol = self.rtol, atol = self.atol, max_step = self.max_step,
+         count_steps = self.count_steps, **options)
+
+
     def _save_to_csv(self,time, sol, save_file_path):
         """
         Saves the provided time steps and solution to a .csv file.
@@ -115,10 +1314,31 @@ class Solution:
             e.g. '../path/to/solution_data.csv'
 
         """
-        if len(time) != len(sol[1]):
-            raise ValueError('The solution must be the same length as the time.')
+        save_csv(time, sol, save_file_path)
+
 
-        solution_data = np.hstack( (time.reshape((len(time),1)), sol.transpose()) )
-        with open(save_file_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile, delimiter=',')
-            writer.writerows(solution_data)
+    def _save_to_binary(self, time, sol, save_file_path, model=None):
+        """
+        Saves the provided time steps and solution in the binary columnar
+        format of ColumnarWriter, without copying the solution.
+
+        Parameters
+        ----------
+        time: list or array of floats, required
+            A list or array of time step values.
+
+        sol: array of floats, required
+            An array of solution values with one row per compartment. Each
+            row must be the same length as the time parameter.
+
+        save_file_path: str or PathLike, required
+            Path of the directory to write.
+
+            e.g. '../path/to/solution_data'
+
+        model: Model class instance, optional
+            The solved model, whose dose type, compartment names and model
+            arguments are saved as metadata.
+
+        """
+        save_binary(time, sol, save_file_path, model, self.compartments)
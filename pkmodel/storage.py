@@ -0,0 +1,223 @@
+#
+# Storage of solutions
+#
+import csv as csv
+import json
+import os
+
+import numpy as np
+
+
+_META_FILE = 'meta.json'
+
+
+def _json_default(obj):
+    # Numpy scalars in model arguments are saved as python numbers
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+class ColumnarWriter:
+    """
+    A writer of solutions in a binary columnar format
+
+    A solution is saved as a directory holding one raw binary file per
+    column (time and each compartment) and a meta.json file with the column
+    names, data type, number of rows and any further metadata, such as the
+    dose type and model arguments. Each column is written straight from the
+    rows of the solution array, without transposing or stacking it, and
+    can be appended to in chunks. Columns are read back as memory maps by
+    read_columnar.
+
+    Parameters
+    ----------
+
+    save_file_path: str or PathLike, required
+        Path of the directory to write, e.g. '../path/to/solution_data'
+
+    names: list of str, required
+        Names of the compartments, in the order of the rows of the solution,
+        e.g. ['q_c', 'q_p1']
+
+    metadata: dict, optional
+        Further JSON serialisable metadata saved with the solution.
+
+    mode: str, optional
+        'w' = replace any existing solution (default)
+        'a' = append to an existing solution
+
+    dtype: str or numpy dtype, optional
+        Data type of the columns, defaults to float64.
+
+    """
+
+    def __init__(self, save_file_path, names, metadata=None, mode='w',
+                 dtype=np.float64):
+        if mode not in ('w', 'a'):
+            raise ValueError("Not a valid mode. 'w' or 'a' required")
+
+        self.path = save_file_path
+        self.columns = ['t'] + list(names)
+        self.dtype = np.dtype(dtype)
+        self.metadata = dict(metadata or {})
+        self.length = 0
+
+        meta_path = os.path.join(save_file_path, _META_FILE)
+        if mode == 'a' and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['columns'] != self.columns:
+                raise ValueError("The columns do not match the columns of "
+                                 "the existing solution")
+            self.dtype = np.dtype(meta['dtype'])
+            self.length = meta['length']
+            self.metadata = dict(meta['metadata'], **self.metadata)
+
+        os.makedirs(save_file_path, exist_ok=True)
+        file_mode = 'ab' if self.length else 'wb'
+        self._files = [open(self._column_path(name), file_mode)
+                       for name in self.columns]
+        self._write_meta()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _write_meta(self):
+        meta = {'columns': self.columns,
+                'dtype': self.dtype.str,
+                'length': self.length,
+                'metadata': self.metadata}
+        with open(os.path.join(self.path, _META_FILE), 'w') as f:
+            json.dump(meta, f, default=_json_default)
+
+    def append(self, time, sol):
+        """
+        Appends a chunk of time steps and solution values.
+
+        Parameters
+        ----------
+        time: array_like of floats, required
+            Time steps of the chunk.
+
+        sol: array_like of floats, required
+            Solution values of the chunk with one row per compartment. Each
+            row must be the same length as time.
+
+        """
+        time = np.asarray(time)
+        sol = np.asarray(sol)
+        if sol.ndim != 2 or sol.shape != (len(self.columns) - 1, len(time)):
+            raise ValueError('The solution must have one row per compartment '
+                             'of the same length as the time.')
+
+        for f, column in zip(self._files, [time] + list(sol)):
+            np.ascontiguousarray(column, dtype=self.dtype).tofile(f)
+        self.length += len(time)
+
+    def close(self):
+        """
+        Flushes the columns and records their length in the metadata.
+        """
+        for f in self._files:
+            f.close()
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_columnar(path):
+    """
+    Returns True if the path is a solution saved by ColumnarWriter.
+    """
+    return os.path.isfile(os.path.join(path, _META_FILE))
+
+
+def read_columnar(path, mmap=True):
+    """
+    Reads a solution saved by ColumnarWriter.
+
+    Parameters
+    ----------
+    path: str or PathLike, required
+        Path of the solution directory.
+
+    mmap: bool, optional
+        If True (default) then columns are memory mapped rather than read.
+
+    Returns
+    -------
+
+    :return (time, columns, metadata): the time column, a list of the
+        compartment columns and the metadata dict, which includes the
+        compartment names under 'compartments'.
+
+    """
+    with open(os.path.join(path, _META_FILE)) as f:
+        meta = json.load(f)
+
+    dtype = np.dtype(meta['dtype'])
+    columns = []
+    for name in meta['columns']:
+        column_path = os.path.join(path, name + '.bin')
+        if meta['length'] == 0:
+            columns.append(np.empty(0, dtype))
+        elif mmap:
+            columns.append(np.memmap(column_path, dtype=dtype, mode='r',
+                                     shape=(meta['length'],)))
+        else:
+            columns.append(np.fromfile(column_path, dtype=dtype,
+                                       count=meta['length']))
+
+    metadata = dict(meta['metadata'], compartments=meta['columns'][1:])
+    return columns[0], columns[1:], metadata
+
+
+def save_csv(time, sol, save_file_path):
+    """
+    Saves the provided time steps and solution to a .csv file with one
+    row per time step, see Solution._save_to_csv.
+    """
+    if len(time) != np.shape(sol)[1]:
+        raise ValueError('The solution must be the same length as the time.')
+
+    with open(save_file_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        if np.asarray(sol).dtype == np.float32:
+            # Single precision values are written with their own shortest
+            # representation rather than that of their double
+            writer.writerows(zip(np.asarray(time, dtype=float).tolist(),
+                                 *np.asarray(sol)))
+            return
+        solution_data = np.hstack( (time.reshape((len(time),1)), sol.transpose()) )
+        writer.writerows(solution_data)
+
+
+def save_binary(time, sol, save_file_path, model=None, compartments=None):
+    """
+    Saves the provided time steps and solution with ColumnarWriter, see
+    Solution._save_to_binary. Single precision solutions are saved in
+    single precision. If compartments is given then sol holds only the
+    compartments of the model at these indices.
+    """
+    if len(time) != np.shape(sol)[1]:
+        raise ValueError('The solution must be the same length as the time.')
+
+    if model is not None:
+        names = model.compartment_names()
+        if compartments is not None:
+            names = [names[i] for i in compartments]
+        metadata = {'dose_type': model.dose_type,
+                    'model_args': model.model_args}
+    else:
+        names = ['q%d' %i for i in range(len(sol))]
+        metadata = {}
+
+    dtype = np.float32 if np.asarray(sol).dtype == np.float32 else np.float64
+    with ColumnarWriter(save_file_path, names, metadata, dtype=dtype) \
+            as writer:
+        writer.append(time, sol)
@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class SolutionCacheTest(unittest.TestCase):
+    """
+    Tests the :class:`SolutionCache` class.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.t_eval = np.linspace(0, 1, 50)
+        self.model_args = {'name': 'model', 'V_c': 1.0, 'Q_p1': 2.0,
+                           'V_p1': 3.0, 'CL': 4.0}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def models(self, dose_t = 1.0):
+        return [pk.Model(2, dict(self.model_args, name = 'model%d' %i,
+                                 CL = CL), 'iv', dose_t)
+                for i, CL in enumerate([4.0, 2.0, 4.0])]
+
+    def test_key(self):
+        """
+        Tests that keys depend on what determines a solution only.
+        """
+        cache = pk.SolutionCache()
+        model, other, same = self.models()
+        solution = pk.Solution([model], self.t_eval, [[0, 0]])
+        key = cache.key(model, [0, 0], solution)
+        self.assertEqual(key, cache.key(same, [0.0, 0.0], solution))
+        self.assertNotEqual(key, cache.key(other, [0, 0], solution))
+        self.assertNotEqual(key, cache.key(model, [1, 0], solution))
+        self.assertNotEqual(key, cache.key(
+            model, [0, 0], pk.Solution([model], self.t_eval, [[0, 0]],
+                                       rtol = 1e-6)))
+        self.assertNotEqual(key, cache.key(
+            model, [0, 0], pk.Solution([model], self.t_eval[:-1], [[0, 0]])))
+        self.assertNotEqual(key, cache.key(
+            model, [0, 0], pk.Solution([model], self.t_eval, [[0, 0]],
+                                       batch = True)))
+
+        # Doses given as arrays and regimens
+        dose = np.linspace(0, 1, 50)
+        key = cache.key(pk.Model(2, self.model_args, 'iv', dose), [0, 0],
+                        solution)
+        self.assertNotEqual(key, cache.key(
+            pk.Model(2, self.model_args, 'iv', dose * 2), [0, 0], solution))
+        regimen = pk.RepeatedBolus(1.0, tau = 0.5)
+        self.assertEqual(
+            cache.key(pk.Model(2, self.model_args, 'iv', regimen), [0, 0],
+                      solution),
+            cache.key(pk.Model(2, self.model_args, 'iv',
+                               pk.RepeatedBolus(1.0, tau = 0.5)), [0, 0],
+                      solution))
+        self.assertIsNone(cache.key(
+            pk.Model(2, self.model_args, 'iv', lambda t: 1.0), [0, 0],
+            solution))
+
+    def test_solution_cache(self):
+        """
+        Tests that cached solutions are returned without solving again.
+        """
+        cache = pk.SolutionCache(directory = self.directory)
+        solution = pk.Solution(self.models(), self.t_eval, [[0, 0]] * 3,
+                               sink = pk.NullSink(), cache = cache)
+        sol_list = solution.analyse_models()
+        # The third model is the first with another name, solved once
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual([stats.cached for stats in solution.stats],
+                         [False, False, True])
+        self.assertEqual([stats.name for stats in solution.stats],
+                         ['model0', 'model1', 'model2'])
+        np.testing.assert_array_equal(sol_list[0].y, sol_list[2].y)
+
+        again = solution.analyse_models()
+        self.assertEqual(cache.stats()['memory_hits'], 3)
+        self.assertEqual([stats.cached for stats in solution.stats],
+                         [True, True, True])
+        for sol, cached in zip(sol_list, again):
+            np.testing.assert_array_equal(sol.y, cached.y)
+        np.testing.assert_array_equal(again[0].y, again[2].y)
+
+        # Hits are reported under the name of the model looked up
+        renamed = self.models()
+        for i, model in enumerate(renamed):
+            model.model_args = dict(model.model_args, name = 'copy%d' %i)
+        copies = pk.Solution(renamed, self.t_eval, [[0, 0]] * 3,
+                             sink = pk.NullSink(), cache = cache)
+        copies._solve_models()
+        self.assertEqual([stats.name for stats in copies.stats],
+                         ['copy0', 'copy1', 'copy2'])
+        self.assertEqual(sorted(copies.report().slowest),
+                         ['copy0', 'copy1', 'copy2'])
+
+        # The disk tier outlives the memory tier
+        cache = pk.SolutionCache(directory = self.directory)
+        solution.cache = cache
+        solution._solve_models()
+        stats = cache.stats()
+        self.assertEqual(stats['disk_hits'], 2)
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['misses'], 0)
+        self.assertEqual(stats['hit_rate'], 1.0)
+        self.assertEqual(stats['disk_entries'], 2)
+
+        cache.clear()
+        self.assertEqual(cache.stats()['disk_entries'], 0)
+
+    def test_eviction(self):
+        """
+        Tests that both tiers are bounded.
+        """
+        t_eval = np.linspace(0, 1, 1000)
+        models = [pk.Model(2, dict(self.model_args, CL = CL), 'iv', 1.0)
+                  for CL in [1.0, 2.0, 3.0]]
+        cache = pk.SolutionCache(directory = self.directory)
+        pk.Solution(models[:1], t_eval, [[0, 0]], cache = cache)\
+            ._solve_models()
+        size = cache.stats()['disk_bytes']
+        cache.clear()
+
+        # Room for two solutions of about the same size
+        cache = pk.SolutionCache(maxsize = 1, directory = self.directory,
+                                 max_bytes = 5 * size // 2)
+        solution = pk.Solution(models, t_eval, [[0, 0]] * 3, cache = cache)
+        solution._solve_models()
+        stats = cache.stats()
+        self.assertEqual(stats['memory_entries'], 1)
+        self.assertEqual(stats['disk_entries'], 2)
+        self.assertLessEqual(stats['disk_bytes'], 5 * size // 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
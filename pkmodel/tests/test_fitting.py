@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class FitTest(unittest.TestCase):
+    """
+    Tests the :class:`Fit` class.
+    """
+
+    def setUp(self):
+        self.true_args = {'name': 'subject', 'V_c': 2.0, 'Q_p1': 1.5,
+                          'V_p1': 4.0, 'CL': 0.8, 'k_a': 1.2}
+        self.times = np.array([0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24])
+        # An oral dose absorbed from the first compartment, without
+        # discontinuities that would spoil finite differences
+        self.dose = 0.0
+        self.y0 = [10.0, 0, 0]
+
+    def observe(self, model_args):
+        # Concentrations of the central compartment at the times
+        model = pk.Model(3, model_args, 'sc', self.dose)
+        t_eval = np.concatenate([[0], self.times])
+        solution = pk.Solution([model], t_eval, [self.y0], rtol = 1e-10,
+                               atol = 1e-12)
+        sol = solution._solve_models()[0]
+        return sol.y[1, 1:] / model_args['V_c']
+
+    def test_jacobian(self):
+        """
+        Tests the Jacobian of the residuals against finite differences.
+        """
+        model = pk.Model(3, self.true_args, 'sc', self.dose)
+        fit = pk.Fit(model, self.times, self.observe(self.true_args),
+                     ['V_c', 'CL', 'Q_p1', 'k_a'], y0 = self.y0,
+                     weights = 2.0)
+        x = fit.x0() + 0.1
+        J = fit.jacobian(x)
+        self.assertEqual(J.shape, (10, 4))
+        eps = 1e-6
+        for j in range(4):
+            dx = np.zeros(4)
+            dx[j] = eps
+            J_fd = (fit.residuals(x + dx) - fit.residuals(x - dx)) / (2 * eps)
+            np.testing.assert_allclose(J[:, j], J_fd, rtol = 1e-4,
+                                       atol = 1e-7)
+
+        # The model given to the fit is not modified
+        self.assertEqual(model.model_args, self.true_args)
+
+    def test_fit(self):
+        """
+        Tests that the true parameters are recovered, for many subjects.
+        """
+        fits = []
+        truths = []
+        for scale in [1.0, 1.5]:
+            true_args = dict(self.true_args, V_c = 2.0 * scale,
+                             CL = 0.8 / scale)
+            start = dict(self.true_args, V_c = 1.0, CL = 2.0, Q_p1 = 1.0,
+                         k_a = 2.0)
+            fits.append(pk.Fit(pk.Model(3, start, 'sc', self.dose),
+                               self.times, self.observe(true_args),
+                               ['V_c', 'CL', 'Q_p1', 'k_a'], y0 = self.y0))
+            truths.append(true_args)
+
+        for processes in [None, 2]:
+            results = pk.fit_all(fits, processes = processes)
+            for result, true_args in zip(results, truths):
+                self.assertTrue(result.success)
+                for name, value in result.parameters.items():
+                    self.assertAlmostEqual(value, true_args[name], places = 4)
+                self.assertEqual(result.model.model_args['V_c'],
+                                 result.parameters['V_c'])
+
+        with self.assertRaises(ValueError):
+            pk.Fit(pk.Model(3, self.true_args, 'sc', self.dose), self.times,
+                   self.observe(self.true_args), ['V_q'])
+        with self.assertRaises(ValueError):
+            pk.Fit(pk.Model(3, self.true_args, 'sc', np.ones(10)),
+                   self.times, self.observe(self.true_args), ['CL'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+import unittest
+
+
+HEAVY_MODULES = ('matplotlib', 'pandas', 'scipy.integrate', 'scipy.linalg',
+                 'scipy.optimize', 'scipy.sparse', 'scipy.spatial')
+
+
+def imported_modules(code):
+    """
+    Runs code in a fresh interpreter and returns the heavy modules it
+    imported.
+    """
+    script = (code + "\nimport sys\n"
+              "print(' '.join(m for m in %r if m in sys.modules))"
+              % (HEAVY_MODULES,))
+    output = subprocess.run([sys.executable, '-c', script], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    return output.stdout.split()
+
+
+class ImportTest(unittest.TestCase):
+    """
+    Tests the cost of importing :mod:`pkmodel`.
+    """
+
+    def test_lazy_visualisation(self):
+        """
+        Tests that solving does not import the plotting dependencies, which
+        are only imported on first use of Visualisation.
+        """
+        self.assertEqual(imported_modules("import pkmodel\n"
+                                          "pkmodel.Solution\n"
+                                          "pkmodel.Population"), [])
+        self.assertEqual(imported_modules("import pkmodel\n"
+                                          "pkmodel.Visualisation"),
+                         ['matplotlib', 'pandas'])
+        self.assertEqual(imported_modules("from pkmodel import Visualisation"),
+                         ['matplotlib', 'pandas'])
+
+    def test_lazy_scipy(self):
+        """
+        Tests that importing pkmodel and building models does not import the
+        scipy submodules, which are only imported once models are solved.
+        """
+        self.assertEqual(imported_modules(
+            "import pkmodel\n"
+            "model = pkmodel.Model(1, {'name': 'm', 'V_c': 1.0, 'CL': 1.0},"
+            " 'iv', 1.0)\n"
+            "solution = pkmodel.Solution([model], [0, 1], [[0]])\n"
+            "pkmodel.Propagator(model.make_matrix())"), [])
+        self.assertIn('scipy.integrate', imported_modules(
+            "import pkmodel\n"
+            "model = pkmodel.Model(1, {'name': 'm', 'V_c': 1.0, 'CL': 1.0},"
+            " 'iv', 1.0)\n"
+            "pkmodel.Solution([model], [0, 1], [[0]])._solve_models()"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+import pkmodel as pk
+from pkmodel import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    """
+    Tests the exposure metrics of :mod:`metrics`.
+    """
+
+    def setUp(self):
+        # Exponential decays c * exp(-k t) of known metrics
+        self.t = np.linspace(0, 10, 2001)
+        self.c = np.array([[2.0, 1.0], [4.0, 3.0], [1.0, 5.0]])
+        self.k = np.array([[0.5, 0.2], [0.3, 0.7], [1.0, 0.1]])
+        self.y = self.c[..., None] * np.exp(-self.k[..., None] * self.t)
+
+    def test_metrics(self):
+        """
+        Tests the metrics of a stack of trajectories against their analytic
+        values.
+        """
+        result = metrics.summarise(self.t, self.y, threshold=0.5)
+        self.assertEqual(list(result), metrics.METRICS)
+        for name in metrics.METRICS:
+            self.assertEqual(result[name].shape, (3, 2))
+
+        auc = self.c / self.k * (1 - np.exp(-self.k * 10))
+        np.testing.assert_allclose(result['auc'], auc, rtol=1e-5)
+        np.testing.assert_array_equal(result['cmax'], self.c)
+        np.testing.assert_array_equal(result['tmax'], 0.0)
+        np.testing.assert_allclose(result['half_life'], np.log(2) / self.k)
+        above = np.clip(np.log(self.c / 0.5) / self.k, 0, 10)
+        np.testing.assert_allclose(result['time_above'], above, rtol=1e-5)
+
+        # No threshold, and a half-life only for decreasing trajectories
+        result = metrics.summarise(self.t, np.stack([self.t, -self.t]))
+        self.assertTrue(np.all(np.isnan(result['time_above'])))
+        self.assertTrue(np.all(np.isnan(result['half_life'])))
+        self.assertEqual(result['tmax'][0], 10.0)
+
+    def test_running_metrics(self):
+        """
+        Tests that metrics updated chunk by chunk match the metrics of the
+        whole trajectories.
+        """
+        expected = metrics.summarise(self.t, self.y, threshold=0.5)
+        running = pk.RunningMetrics(threshold=0.5)
+        with self.assertRaises(ValueError):
+            running.result()
+        for start in range(0, len(self.t), 300):
+            running.update(self.t[start:start + 300],
+                           self.y[..., start:start + 300])
+        result = running.result()
+        for name in metrics.METRICS:
+            np.testing.assert_allclose(result[name], expected[name],
+                                       rtol=1e-12)
+
+    def test_metrics_sink(self):
+        """
+        Tests the metrics of solutions written to a MetricsSink, which are
+        not kept.
+        """
+        models = [pk.Model(1, {'name': 'model%d' %i, 'V_c': 1.0,
+                               'CL': 1.0 + i}, 'iv', 0.0)
+                  for i in range(3)]
+        t_eval = np.linspace(0, 5, 101)
+        solution = pk.Solution(models, t_eval, [[10.0]] * 3, rtol=1e-8,
+                               atol=1e-10)
+        t, y = metrics.stack(solution._solve_models())
+        self.assertEqual(y.shape, (3, 1, 101))
+
+        sink = pk.MetricsSink()
+        solution = pk.Solution(models, t_eval, [[10.0]] * 3, rtol=1e-8,
+                               atol=1e-10, sink=sink)
+        self.assertEqual(solution.analyse_models(keep=False), [])
+        self.assertEqual(list(sink.metrics), ['model0', 'model1', 'model2'])
+        for i in range(3):
+            np.testing.assert_allclose(sink.metrics['model%d' %i]['auc'],
+                                       metrics.auc(t, y[i]))
+            np.testing.assert_allclose(sink.metrics['model%d' %i]['half_life'],
+                                       np.log(2) / (1.0 + i), rtol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pkmodel as pk
 
 
@@ -98,5 +99,189 @@ class ModelTest(unittest.TestCase):
 
         rates = obj1.rhs(t = 0, y = [0,0,0],args = args)
         assert len(rates) == 3, 'sc ODE system incorrectly defined'
+        assert obj1.compartment_names() == ['q_0', 'q_c', 'q_p1'], \
+            'sc compartments incorrectly named'
 
 
+    def test_model_matrix_engine(self):
+        """
+        Tests the matrix form of the right hand side against the list form.
+
+        """
+
+        test_args_sc4 = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'Q_p2': 0.5,
+            'V_p2': 6.0,
+            'CL': 4.0,
+            'k_a':5.0
+        }
+
+        test_args_iv3 = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'Q_p2': 0.5,
+            'V_p2': 6.0,
+            'CL': 4.0
+        }
+
+        # Unavailable engine
+        with self.assertRaises(ValueError):
+            pk.Model(3, test_args_iv3, 'iv', [0], engine='tensor')
+
+        y = [0.3, 1.2, 0.7, 2.0]
+        for components, model_args, dose_type in [(4, test_args_sc4, 'sc'),
+                                                  (3, test_args_iv3, 'iv')]:
+            obj1 = pk.Model(components,model_args,dose_type,1.5,
+                            engine='matrix')
+            args = obj1.make_args()
+            K = obj1.make_matrix(args)
+            assert K.shape == (components, components), \
+                'Rate matrix incorrectly defined'
+
+            rates_list = obj1.rhs(t = 0, y = y[:components], args = args)
+            rates_matrix = obj1.rhs_matrix(t = 0, y = np.array(y[:components]),
+                                           K = K)
+            np.testing.assert_allclose(rates_matrix, rates_list)
+
+    def test_model_generated_engine(self):
+        """
+        Tests the generated right hand side and Jacobian against the list
+        form and the rate matrix, to the bit.
+
+        """
+        rng = np.random.default_rng(1)
+        t_grid = np.linspace(0, 10, 11)
+        for dose_type in ['iv', 'sc']:
+            for components in range(1 + (dose_type == 'sc'), 7):
+                model_args = {'name': 'test_model',
+                              'V_c': rng.uniform(0.1, 5),
+                              'CL': rng.uniform(0.1, 5)}
+                if dose_type == 'sc':
+                    model_args['k_a'] = rng.uniform(0.1, 5)
+                peripherals = components - 1 - (dose_type == 'sc')
+                for i in range(1, peripherals + 1):
+                    model_args['V_p%d' %i] = rng.uniform(0.1, 5)
+                    model_args['Q_p%d' %i] = rng.uniform(0.1, 5)
+
+                obj1 = pk.Model(components, model_args, dose_type,
+                                rng.uniform(0, 2, 11), engine = 'generated',
+                                dose_grid = t_grid)
+                args = obj1.make_args()
+                rhs, jac = obj1.make_generated(args)
+                np.testing.assert_array_equal(jac(0, None),
+                                              obj1.make_matrix(args))
+                for t in [0.0, 3.7, 10.0]:
+                    y = rng.uniform(0, 10, components)
+                    np.testing.assert_array_equal(rhs(t, y),
+                                                  obj1.rhs(t, y, args))
+
+        # One compiled factory per topology
+        self.assertIs(pk.model._generated_factory(3, 'iv'),
+                      pk.model._generated_factory(3, 'iv'))
+
+    def test_model_matrix_derivatives(self):
+        """
+        Tests the derivatives of the rate matrix against finite differences.
+
+        """
+        model_args = {'name': 'test_model', 'V_c': 1.0, 'Q_p1': 2.0,
+                      'V_p1': 3.0, 'Q_p2': 0.5, 'V_p2': 6.0, 'CL': 4.0,
+                      'k_a': 5.0}
+        obj1 = pk.Model(4, model_args, 'sc', 0)
+        names = obj1.parameter_names()
+        self.assertEqual(names, ['k_a', 'V_c', 'V_p1', 'V_p2', 'Q_p1',
+                                 'Q_p2', 'CL'])
+        dK = obj1.make_matrix_derivatives()
+        eps = 1e-6
+        for j, name in enumerate(names):
+            plus = dict(model_args, **{name: model_args[name] + eps})
+            minus = dict(model_args, **{name: model_args[name] - eps})
+            dK_fd = (pk.Model(4, plus, 'sc', 0).make_matrix()
+                     - pk.Model(4, minus, 'sc', 0).make_matrix()) / (2 * eps)
+            np.testing.assert_allclose(dK[j], dK_fd, rtol=1e-6, atol=1e-8)
+
+        M = obj1.make_sensitivity_matrix()
+        self.assertEqual(M.shape, (32, 32))
+        np.testing.assert_array_equal(M[:4, :4], obj1.make_matrix())
+        np.testing.assert_array_equal(M[:4, 4:], 0)
+
+    def test_model_jacobian(self):
+        """
+        Tests the analytic Jacobian and its sparsity pattern.
+
+        """
+
+        test_args_sc4 = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'Q_p2': 0.5,
+            'V_p2': 6.0,
+            'CL': 4.0,
+            'k_a':5.0
+        }
+
+        obj1 = pk.Model(4,test_args_sc4,'sc',0)
+        args = obj1.make_args()
+        y = np.array([0.3, 1.2, 0.7, 2.0])
+        J = obj1.jacobian(0, y, args)
+
+        # Finite difference approximation of the Jacobian
+        eps = 1e-6
+        J_fd = np.zeros((4, 4))
+        for j in range(4):
+            dy = np.zeros(4)
+            dy[j] = eps
+            J_fd[:, j] = (np.array(obj1.rhs(0, y + dy, args))
+                          - np.array(obj1.rhs(0, y - dy, args))) / (2 * eps)
+        np.testing.assert_allclose(J, J_fd, rtol=1e-6, atol=1e-8)
+
+        S = obj1.jac_sparsity()
+        np.testing.assert_array_equal(S, J != 0)
+
+    def test_model_dose(self):
+        """
+        Tests the evaluation of the dose as a function of time.
+
+        """
+
+        test_args_iv1 = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'CL': 2.0
+        }
+
+        protocol = pk.Protocol(quantity = 2, t_start = 0, t_end = 10, n = 11)
+        X = protocol.linear_dose()
+
+        # Uniform and non-uniform grids
+        grids = [protocol.t, protocol.t ** 2 / 10]
+        for grid in grids:
+            obj1 = pk.Model(1,test_args_iv1,'iv',X,dose_grid=grid)
+            t = np.array([-1.0, 0.0, 0.5, 3.3, 9.99, 10.0, 12.0])
+            expected = np.interp(t, grid, X)
+            np.testing.assert_allclose([obj1.dose(x) for x in t], expected)
+            np.testing.assert_allclose(obj1.dose(t), expected)
+
+            # The dose does not depend on the number of evaluations
+            rates = [obj1.rhs(t = 3.3, y = [0], args = obj1.make_args())
+                     for i in range(50)]
+            assert all(rate == rates[0] for rate in rates)
+
+        # A constant dose does not need a grid
+        obj1 = pk.Model(1,test_args_iv1,'iv',2.0)
+        assert obj1.dose(100.0) == 2.0
+
+        # A dose schedule needs a grid of the same length
+        obj1 = pk.Model(1,test_args_iv1,'iv',X)
+        with self.assertRaises(ValueError):
+            obj1.dose(1.0)
+        with self.assertRaises(ValueError):
+            obj1.set_dose_grid(np.linspace(0, 10, 5))
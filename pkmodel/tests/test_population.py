@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class PopulationTest(unittest.TestCase):
+    """
+    Tests the :class:`Population` class.
+    """
+
+    def test_population_parameters(self):
+        """
+        Tests the generation of parameters from values, grids and
+        distributions.
+        """
+        parameters = {
+            'V_c': [1.0, 2.0, 3.0],
+            'Q_p1': 2.0,
+            'V_p1': lambda rng, size: rng.uniform(1.0, 2.0, size),
+            'CL': [0.5, 1.0],
+            'k_a': lambda rng, size: rng.lognormal(0.0, 0.2, size)
+        }
+        population = pk.Population(3, 'sc', 1.0, parameters, size=4, seed=1)
+        self.assertEqual(len(population), 24)
+
+        values = population.parameters(0, 24)
+        self.assertEqual(values['V_c'].shape, (24,))
+        np.testing.assert_array_equal(values['V_c'],
+                                      np.repeat([1.0, 2.0, 3.0], 8))
+        np.testing.assert_array_equal(values['CL'][:8],
+                                      np.repeat([0.5, 1.0], 4))
+        np.testing.assert_array_equal(values['Q_p1'], 2.0)
+        self.assertTrue(np.all((values['V_p1'] >= 1) & (values['V_p1'] < 2)))
+
+        # Subjects do not depend on the chunk size
+        population = pk.Population(3, 'sc', 1.0, parameters, size=4, seed=1)
+        chunks = [population.parameters(start, start + 5)
+                  for start in range(0, 24, 5)]
+        for key in values:
+            np.testing.assert_array_equal(
+                np.concatenate([chunk[key] for chunk in chunks]), values[key])
+
+        models = population.models(20, 30)
+        self.assertEqual(len(models), 4)
+        self.assertEqual(models[0].model_args['name'], 'subject20')
+
+        # Parameters do not match the topology
+        with self.assertRaises(ValueError):
+            pk.Population(2, 'iv', 1.0, parameters, size=4)
+
+        # No grid and no size
+        with self.assertRaises(ValueError):
+            pk.Population(1, 'iv', 1.0, {'V_c': 1.0, 'CL': 1.0})
+
+    def test_population_sweep(self):
+        """
+        Tests the chunked solution of a population.
+        """
+        parameters = {
+            'V_c': lambda rng, size: rng.uniform(1.0, 2.0, size),
+            'CL': 1.0
+        }
+        population = pk.Population(1, 'iv', 1.0, parameters, size=25, seed=0)
+        t_eval = np.linspace(0, 1, 10)
+
+        starts, sols = [], []
+        for start, values, sol_list in population.sweep(t_eval, chunk_size=10,
+                                                        batch=True):
+            starts.append(start)
+            self.assertEqual(len(sol_list), len(values['V_c']))
+            sols.extend(sol_list)
+
+        self.assertEqual(starts, [0, 10, 20])
+        self.assertEqual(len(sols), 25)
+        self.assertEqual(sols[0].y.shape, (1, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
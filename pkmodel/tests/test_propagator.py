@@ -0,0 +1,106 @@
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class PropagatorTest(unittest.TestCase):
+    """
+    Tests the :class:`Propagator` class.
+    """
+
+    def test_propagate_analytic(self):
+        """
+        Tests the propagation of a one compartment model against its
+        analytical solution for constant and linear doses.
+        """
+        k = 2.0
+        K = np.array([[-k]])
+        t = np.linspace(0, 5, 101)
+
+        # Constant dose D
+        D = 3.0
+        sol = pk.Propagator(K, 'constant').propagate(t, [0.0], D)
+        np.testing.assert_allclose(sol.y[0], D / k * (1 - np.exp(-k * t)),
+                                   rtol=1e-10, atol=1e-12)
+
+        # Linear dose a*t
+        a = 1.5
+        sol = pk.Propagator(K).propagate(t, [0.0], a * t)
+        y_sol = a / k * t - a / k**2 * (1 - np.exp(-k * t))
+        np.testing.assert_allclose(sol.y[0], y_sol, rtol=1e-10, atol=1e-12)
+        self.assertTrue(sol.success)
+
+        with self.assertRaises(ValueError):
+            pk.Propagator(K, 'cubic')
+
+    def test_propagate_grids(self):
+        """
+        Tests that uniform and non-uniform grids are propagated alike, and
+        that matrix exponentials are counted apart from LU decompositions.
+        """
+        K = np.array([[-6.0, 2.0, 5.0], [2.0, -2.0, 0.0], [0.0, 0.0, -5.0]])
+        propagator = pk.Propagator(K)
+        t = np.linspace(0, 5, 51)
+        u = 2 + np.sin(t)
+        sol = propagator.propagate(t, [0.0, 1.0, 0.0], u)
+        self.assertEqual((sol.nlu, sol.nexpm), (0, 1))
+
+        # The same time points with one interval split in two
+        t_split = np.insert(t, 1, 0.05)
+        u_split = np.insert(u, 1, 2 + np.sin(0.05))
+        split = propagator.propagate(t_split, [0.0, 1.0, 0.0], u_split)
+        self.assertEqual((split.nlu, split.nexpm), (0, 2))
+        np.testing.assert_allclose(np.delete(split.y, 1, axis=1), sol.y,
+                                   rtol=1e-3, atol=1e-6)
+
+    def test_solution_expm_engine(self):
+        """
+        Tests the 'expm' engine of Solution against solve_ivp.
+        """
+        model_args = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'CL': 4.0,
+            'k_a': 5.0
+        }
+        t_eval = np.linspace(0, 1, 100)
+        y_0 = [[0, 0, 0]]
+        dose_t = 2 * np.ones(100)
+
+        model = pk.Model(3, model_args, 'sc', dose_t)
+        exact = pk.Solution([model], t_eval, y_0, engine='expm')
+        sol = exact._integrate(model, model.make_args(), np.array(y_0[0]))
+
+        model = pk.Model(3, model_args, 'sc', dose_t)
+        numeric = pk.Solution([model], t_eval, y_0, rtol=1e-10, atol=1e-12)
+        sol_ivp = numeric._integrate(model, model.make_args(),
+                                     np.array(y_0[0]))
+        np.testing.assert_allclose(sol.y, sol_ivp.y, rtol=1e-7, atol=1e-9)
+
+        # The dose must be given at the time points of t_eval
+        model = pk.Model(3, model_args, 'sc', np.ones(10))
+        with self.assertRaises(ValueError):
+            exact._integrate(model, model.make_args(), np.array(y_0[0]))
+
+    def test_interpolant(self):
+        """
+        Test that the interpolant is exact between time points for a
+        linearly interpolated dose.
+        """
+        K = np.array([[-1.0, 0.5], [1.0, -0.5]])
+        t = np.linspace(0, 4, 5)
+        dose = np.array([0.0, 2.0, 1.0, 1.0, 0.0])
+        propagator = pk.Propagator(K)
+        sol = propagator.propagate(t, [1.0, 0.0], dose, dense_output=True)
+        np.testing.assert_allclose(sol.sol(t), sol.y, rtol=1e-12, atol=1e-14)
+
+        # Propagating to an intermediate time from its time point
+        fine = np.array([1.0, 1.3, 2.0])
+        part = propagator.propagate(fine, sol.y[:, 1], [2.0, 1.7, 1.0])
+        np.testing.assert_allclose(sol.sol(1.3), part.y[:, 1], rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
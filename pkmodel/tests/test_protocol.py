@@ -1,6 +1,7 @@
 
 
 import unittest
+import numpy as np
 from pkmodel import Protocol
 
 
@@ -65,6 +66,31 @@ class ProtocolTest(unittest.TestCase):
 
 
 
+    def test_instantaneous_dose_many_boluses(self):
+
+        """
+        Test the instantaneous dose function with an arbitrary number of boluses
+        against a direct evaluation of the truncated Gaussians
+        """
+        protocol = Protocol(quantity = 2, t_end = 100, n = 10001)
+        times = np.array([5.0, 7.5, 20.0, 21.0, 99.0])
+        amounts = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+        X = protocol.instantaneous_dose(sigma = 0.5, times = times, amounts = amounts)
+
+        t = protocol.t
+        expected = np.zeros_like(t)
+        for T, amount in zip(times, amounts):
+            window = (t > T - 1.5) & (t < T + 1.5)
+            expected[window] += amount * np.exp(-0.5 * ((t[window] - T) / 0.5)**2)
+        np.testing.assert_allclose(X, expected)
+
+        # Amounts default to the protocol quantity
+        X = protocol.instantaneous_dose(times = [50.0])
+        self.assertEqual(X.max(), 2)
+        self.assertEqual(X[4000], 0)
+
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class RegimenTest(unittest.TestCase):
+    """
+    Tests the :class:`Regimen` classes.
+    """
+
+    def test_bolus(self):
+        """
+        Tests boluses against Protocol.instantaneous_dose, whose boluses
+        peak at their amount rather than deliver it, and repeated boluses
+        against boluses at explicit times.
+        """
+        protocol = pk.Protocol(quantity = 2, t_end = 100, n = 1001)
+        times = [5.0, 7.5, 20.0, 99.0]
+        amounts = [1.0, 2.0, 3.0, 4.0]
+        X = protocol.instantaneous_dose(sigma = 0.5, times = times,
+                                        amounts = amounts)
+        X = X / (pk.regimen._BOLUS_AREA * 0.5)
+        bolus = pk.Bolus(times, amounts, sigma = 0.5)
+        np.testing.assert_allclose(bolus(protocol.t), X)
+        np.testing.assert_allclose([bolus(t) for t in protocol.t], X)
+
+        # Each bolus delivers its amount, as it does as an impulse
+        t = np.linspace(0, 30, 300001)
+        y = bolus(t)
+        np.testing.assert_allclose(np.sum(np.diff(t) * (y[1:] + y[:-1])) / 2,
+                                   6.0, rtol = 1e-6)
+
+        repeated = pk.RepeatedBolus(3.0, tau = 2.5, start = 1.0, count = 10)
+        explicit = pk.Bolus(1.0 + 2.5 * np.arange(10), 3.0)
+        t = np.linspace(-5, 40, 451)
+        np.testing.assert_allclose(repeated(t), explicit(t), atol = 1e-12)
+        self.assertAlmostEqual(repeated(1.0 + 2.5 * 3), explicit(8.5))
+
+        # Indefinitely repeated boluses far in the future
+        repeated = pk.RepeatedBolus(3.0, tau = 24)
+        self.assertAlmostEqual(repeated(24 * 10000.0),
+                               3.0 / pk.regimen._BOLUS_AREA)
+
+        with self.assertRaises(ValueError):
+            pk.RepeatedBolus(3.0, tau = 0)
+
+        # Boluses as discrete events
+        regimen = pk.loading_dose(10.0, 5.0, tau = 12, count = 3)
+        times, amounts = regimen.bolus_events(0, 30)
+        np.testing.assert_array_equal(times, [0.0, 12.0, 24.0])
+        np.testing.assert_array_equal(amounts, [10.0, 5.0, 5.0])
+        times, amounts = regimen.bolus_events(12, 100)
+        np.testing.assert_array_equal(times, [12.0, 24.0, 36.0])
+        self.assertEqual(regimen.infusion_rate(12.0), 0.0)
+
+    def test_infusion_and_combination(self):
+        """
+        Tests infusion windows and sums of regimens.
+        """
+        infusion = pk.Infusion(starts = [0, 5, 20], ends = [10, 6, 30],
+                               rates = [1.0, 2.0, 0.5])
+        t = np.array([-1, 0, 4.9, 5, 5.5, 6, 10, 15, 20, 29.9, 30, 50])
+        expected = np.array([0, 1, 1, 3, 3, 1, 0, 0, 0.5, 0.5, 0, 0])
+        np.testing.assert_allclose(infusion(t), expected, atol = 1e-12)
+        self.assertAlmostEqual(infusion(5.5), 3.0)
+
+        with self.assertRaises(ValueError):
+            pk.Infusion(starts = [1], ends = [0], rates = 1.0)
+
+        regimen = pk.loading_dose(10.0, 5.0, tau = 12, count = 3) + infusion
+        self.assertIsInstance(regimen, pk.CombinedRegimen)
+        self.assertEqual(len(regimen.regimens), 3)
+        t = np.linspace(0, 50, 101)
+        expected = (pk.Bolus([0.0, 12.0, 24.0, 36.0], [10.0, 5.0, 5.0, 5.0])(t)
+                    + infusion(t))
+        np.testing.assert_allclose(regimen(t), expected)
+        np.testing.assert_allclose([regimen(x) for x in t], expected)
+        self.assertIs(sum([infusion]), infusion)
+
+    def test_model_regimen(self):
+        """
+        Tests solving a model whose dose is a regimen.
+        """
+        model_args = {'name': 'test_model', 'V_c': 2.0, 'CL': 1.0}
+        t_eval = np.linspace(0, 20, 201)
+        infusion = pk.Infusion(starts = [0], ends = [100], rates = 3.0)
+        model = pk.Model(1, model_args, 'iv', infusion)
+        self.assertEqual(model.dose(5.0), 3.0)
+
+        solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-8,
+                               atol = 1e-10)
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        np.testing.assert_allclose(sol.y[0], 6.0 * (1 - np.exp(-t_eval / 2)),
+                                   rtol = 1e-6, atol = 1e-8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pkmodel as pk
+
+
+class SinksTest(unittest.TestCase):
+    """
+    Tests the result sinks of :class:`Solution`.
+    """
+
+    def setUp(self):
+        self.models = []
+        for i in range(3):
+            model_args = {'name': 'model%d' %i, 'V_c': 1.0 + i, 'CL': 1.0}
+            self.models.append(pk.Model(1, model_args, 'iv', 1.0))
+        self.t_eval = np.linspace(0, 1, 10)
+        self.y0 = [[0]] * 3
+
+    def test_memory_and_null_sinks(self):
+        """
+        Tests that solutions are kept in memory or discarded.
+        """
+        sink = pk.MemorySink()
+        solution = pk.Solution(self.models, self.t_eval, self.y0, sink=sink)
+        sol_list = solution.analyse_models()
+        self.assertEqual(list(sink.solutions), ['model0', 'model1', 'model2'])
+        self.assertIs(sink.solutions['model1'], sol_list[1])
+
+        solution = pk.Solution(self.models, self.t_eval, self.y0,
+                               sink=pk.NullSink())
+        self.assertEqual(len(solution.analyse_models()), 3)
+
+    def test_file_sinks(self):
+        """
+        Tests that solutions are saved to files, also from a background
+        thread.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            csv_directory = os.path.join(directory, 'csv')
+            binary_directory = os.path.join(directory, 'binary')
+            os.mkdir(csv_directory)
+            for sink in [pk.FileSink(csv_directory),
+                         pk.BackgroundSink(pk.FileSink(binary_directory,
+                                                       'binary'),
+                                           maxsize=1)]:
+                with sink:
+                    solution = pk.Solution(self.models, self.t_eval, self.y0,
+                                           sink=sink)
+                    sol_list = solution.analyse_models()
+
+            for i, sol in enumerate(sol_list):
+                data = pd.read_csv(os.path.join(csv_directory, 'model%d' %i),
+                                   header=None).to_numpy()
+                np.testing.assert_allclose(data[:, 1], sol.y[0])
+
+                path = os.path.join(binary_directory, 'model%d' %i)
+                time, columns, metadata = pk.read_columnar(path)
+                np.testing.assert_array_equal(columns[0], sol.y[0])
+
+        with self.assertRaises(ValueError):
+            pk.FileSink(output_format='hdf5')
+
+    def test_background_sink_errors(self):
+        """
+        Tests that errors of the writer thread are raised on close.
+        """
+        class FailingSink(pk.Sink):
+            def write(self, model, sol):
+                raise IOError('disk full')
+
+        sink = pk.BackgroundSink(FailingSink())
+        solution = pk.Solution(self.models, self.t_eval, self.y0, sink=sink)
+        solution.analyse_models()
+        with self.assertRaises(IOError):
+            sink.close()
+
+        with self.assertRaises(ValueError):
+            sink.write(self.models[0], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,9 @@ from unittest.mock import Mock, patch, PropertyMock
 import numpy as np
 import pkmodel as pk
 import math
+import pickle
+import os
+import tempfile
 
 class SolutionTest(unittest.TestCase):
     """
@@ -94,8 +97,669 @@ class SolutionTest(unittest.TestCase):
         # Obtain y values for the analytical solution
         y_sol = np.array([test_solution(x) for x in t_eval])
         self.assertIsNone(np.testing.assert_almost_equal(sol.y[0], y_sol, decimal = 3))
-    
 
+    def test_integrate_matrix_engine(self):
+        """
+        Test that the matrix engine reproduces the list engine trajectories.
+        """
+        model_args = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'CL': 4.0,
+            'k_a': 5.0
+        }
+        t_eval = np.linspace(0, 1, 100)
+        y_0 = [[0, 0, 0]]
+        dose_t = 2 * np.ones(100)
+
+        with self.assertRaises(ValueError):
+            pk.Solution([pk.Model(3, model_args, 'sc', dose_t)],
+                        t_eval, y_0, engine='tensor')
+
+        sols = []
+        for engine in ['list', 'matrix']:
+            model = pk.Model(3, model_args, 'sc', dose_t)
+            solution = pk.Solution([model], t_eval, y_0, engine=engine)
+            sols.append(solution._integrate(model, model.make_args(),
+                                            np.array(y_0[0])))
+        np.testing.assert_allclose(sols[1].y, sols[0].y, rtol=1e-10,
+                                   atol=1e-12)
+
+    def test_integrate_generated_engine(self):
+        """
+        Test that the generated engine reproduces the list engine
+        trajectories exactly.
+        """
+        model_args = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 2.0,
+            'V_p1': 3.0,
+            'CL': 4.0,
+            'k_a': 5.0
+        }
+        t_eval = np.linspace(0, 1, 100)
+        y_0 = [[0, 0, 0]]
+        dose_t = 2 + np.sin(10 * t_eval)
+
+        for method in ['RK45', 'BDF', 'LSODA']:
+            sols = []
+            for engine in ['list', 'generated']:
+                model = pk.Model(3, model_args, 'sc', dose_t)
+                solution = pk.Solution([model], t_eval, y_0, engine=engine,
+                                       method=method)
+                sols.append(solution._integrate(model, model.make_args(),
+                                                np.array(y_0[0])))
+            np.testing.assert_array_equal(sols[1].y, sols[0].y)
+            self.assertEqual(sols[1].nfev, sols[0].nfev)
+
+    def test_dose_grid_not_modified(self):
+        """
+        Test that models without a dose grid are solved on the time points
+        of each solution without being modified.
+        """
+        model_args = {'name': 'test_model', 'V_c': 1.0, 'CL': 1.0}
+        dose = np.linspace(0, 2, 11)
+        model = pk.Model(1, model_args, 'iv', dose)
+        for t_eval in [np.linspace(0, 10, 11), np.linspace(0, 1, 11)]:
+            for batch in [False, True]:
+                solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-8,
+                                       atol = 1e-10, batch = batch,
+                                       incremental = not batch)
+                sol = solution._solve_models()[0]
+                self.assertIsNone(model.dose_grid)
+                expected = pk.Solution(
+                    [pk.Model(1, model_args, 'iv', dose, dose_grid = t_eval)],
+                    t_eval, [[0]], rtol = 1e-8, atol = 1e-10)
+                np.testing.assert_allclose(sol.y,
+                                           expected._solve_models()[0].y,
+                                           rtol = 1e-6, atol = 1e-9)
+
+    def test_integrate_stiff_methods(self):
+        """
+        Test that the implicit methods use the analytic Jacobian and agree
+        with RK45 on a stiff model.
+        """
+        model_args = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 1000.0,
+            'V_p1': 1.0,
+            'CL': 0.01
+        }
+        t_eval = np.linspace(0, 10, 50)
+        y_0 = [[1, 0]]
+        dose_t = 0
+
+        sols = {}
+        for method in ['RK45', 'BDF', 'Radau', 'LSODA']:
+            model = pk.Model(2, model_args, 'iv', dose_t)
+            solution = pk.Solution([model], t_eval, y_0, method=method,
+                                   rtol=1e-6, atol=1e-9)
+            sols[method] = solution._integrate(model, model.make_args(),
+                                               np.array(y_0[0]))
+            self.assertTrue(sols[method].success)
+
+        for method in ['BDF', 'Radau', 'LSODA']:
+            np.testing.assert_allclose(sols[method].y, sols['RK45'].y,
+                                       rtol=1e-3, atol=1e-6)
+            self.assertLess(sols[method].nfev, sols['RK45'].nfev)
+        self.assertEqual(sols['BDF'].njev, 0)
+
+    def test_integrate_reproducible(self):
+        """
+        Test that repeated solves of the same model give the same result
+        and that adaptive steps do not run past the dose schedule.
+        """
+        model_args = {
+            'name': 'test_model',
+            'V_c': 1.0,
+            'Q_p1': 1000.0,
+            'V_p1': 1.0,
+            'CL': 0.01
+        }
+        protocol = pk.Protocol(quantity = 2, t_start = 0, t_end = 10, n = 11)
+        model = pk.Model(2, model_args, 'iv', protocol.steady_dose(),
+                         dose_grid = protocol.t)
+        t_eval = np.linspace(0, 10, 50)
+        solution = pk.Solution([model], t_eval, [[0, 0]], rtol=1e-8)
+
+        sol1 = solution._integrate(model, model.make_args(), np.zeros(2))
+        sol2 = solution._integrate(model, model.make_args(), np.zeros(2))
+        self.assertTrue(sol1.success)
+        self.assertGreater(sol1.nfev, len(protocol.t))
+        np.testing.assert_array_equal(sol1.y, sol2.y)
+
+    def test_integrate_batch(self):
+        """
+        Test that a batched solve of several topologies matches solving
+        each model separately, in the original order.
+        """
+        protocol = pk.Protocol(quantity = 2, t_start = 0, t_end = 10, n = 50)
+        X = protocol.steady_dose()
+        models, y0 = [], []
+        for i in range(6):
+            model_args = {'name': 'model%d' %i, 'V_c': 1.0 + i,
+                          'Q_p1': 2.0, 'V_p1': 3.0, 'CL': 1.0 + i / 2}
+            if i % 2:
+                model_args['k_a'] = 5.0
+                models.append(pk.Model(3, model_args, 'sc', X,
+                                       dose_grid = protocol.t))
+                y0.append([0, 0, 0])
+            else:
+                models.append(pk.Model(2, model_args, 'iv', X * i))
+                y0.append([1, 0])
+
+        for method in ['RK45', 'BDF', 'LSODA']:
+            single = pk.Solution(models, protocol.t, y0, method = method,
+                                 rtol = 1e-8, atol = 1e-10)
+            batch = pk.Solution(models, protocol.t, y0, method = method,
+                                rtol = 1e-8, atol = 1e-10, batch = True)
+            sols = single._solve_models()
+            sols_batch = batch._solve_models()
+            self.assertEqual(len(sols_batch), len(models))
+            for sol, sol_batch in zip(sols, sols_batch):
+                self.assertTrue(sol_batch.success)
+                np.testing.assert_allclose(sol_batch.t, sol.t)
+                np.testing.assert_allclose(sol_batch.y, sol.y, rtol = 1e-5,
+                                           atol = 1e-7)
+
+    def test_process_pool(self):
+        """
+        Test that solving in a process pool gives the serial solutions in
+        the same order and reports failing models without stopping.
+        """
+        t_eval = np.linspace(0, 10, 20)
+        models, y0 = [], []
+        for i in range(5):
+            model_args = {'name': 'model%d' %i, 'V_c': 1.0 + i,
+                          'Q_p1': 2.0, 'V_p1': 3.0, 'CL': 1.0}
+            models.append(pk.Model(2, model_args, 'iv', 1.0 + i))
+            y0.append([0, 0])
+
+        # The dose schedule of this model does not match t_eval
+        models[3].dose_t = np.ones(5)
+
+        # Models and their right hand sides can be sent to other processes
+        copy = pickle.loads(pickle.dumps(models[0]))
+        self.assertEqual(copy.model_args, models[0].model_args)
+        self.assertEqual(copy.make_args(), models[0].make_args())
+        self.assertEqual(copy.rhs(1.0, [0.5, 0.2], copy.make_args()),
+                         models[0].rhs(1.0, [0.5, 0.2],
+                                       models[0].make_args()))
+
+        serial = pk.Solution(models[:3], t_eval, y0[:3], rtol = 1e-8,
+                             atol = 1e-10)
+        sols = serial._solve_models()
+        for batch in [False, True]:
+            pool = pk.Solution(models, t_eval, y0, processes = 2,
+                               chunksize = 2, batch = batch, rtol = 1e-8,
+                               atol = 1e-10)
+            sols_pool = pool._solve_models()
+            self.assertEqual(len(sols_pool), len(models))
+            self.assertEqual(list(pool.errors), [3])
+            self.assertIsInstance(pool.errors[3], ValueError)
+            self.assertIsNone(sols_pool[3])
+            self.assertIsNotNone(sols_pool[4])
+            for sol, sol_pool in zip(sols, sols_pool):
+                np.testing.assert_allclose(sol_pool.y, sol.y, rtol = 1e-5,
+                                           atol = 1e-7)
+
+    def test_impulse_doses(self):
+        """
+        Test that boluses given as impulses match the analytical solution.
+        """
+        model_args = {'name': 'test_model', 'V_c': 2.0, 'CL': 1.0}
+        t_eval = np.linspace(0, 30, 301)
+        regimen = pk.RepeatedBolus(5.0, tau = 6.3, count = 4)
+        times = 6.3 * np.arange(4)
+
+        # Drug decays at rate CL/V_c after each bolus
+        y_sol = np.zeros_like(t_eval)
+        for T in times:
+            y_sol += np.where(t_eval >= T, 5.0 * np.exp(-(t_eval - T) / 2), 0)
+
+        for engine in ['list', 'expm']:
+            model = pk.Model(1, model_args, 'iv', regimen)
+            solution = pk.Solution([model], t_eval, [[0]], engine = engine,
+                                   rtol = 1e-10, atol = 1e-12,
+                                   impulse_doses = True)
+            sol = solution._integrate(model, model.make_args(), np.zeros(1))
+            self.assertTrue(sol.success)
+            np.testing.assert_allclose(sol.t, t_eval)
+            np.testing.assert_allclose(sol.y[0], y_sol, rtol = 1e-7,
+                                       atol = 1e-9)
+            # The model itself still sees the smoothed boluses
+            self.assertFalse(model.impulse_doses)
+
+        # Narrow smoothed boluses approach the impulses
+        sigma = 0.01
+        smooth = pk.RepeatedBolus(5.0, tau = 6.3, start = 0.05, count = 4,
+                                  sigma = sigma)
+        model = pk.Model(1, model_args, 'iv', smooth)
+        solution = pk.Solution([model], t_eval, [[0]], max_step = sigma)
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        y_late = np.zeros_like(t_eval)
+        for T in times + 0.05:
+            y_late += np.where(t_eval >= T, 5.0 * np.exp(-(t_eval - T) / 2), 0)
+        far = np.min(np.abs(t_eval[:, None] - (times + 0.05)), axis = 1) > 0.1
+        np.testing.assert_allclose(sol.y[0][far], y_late[far], rtol = 1e-2)
+
+        # Wide smoothed boluses deliver the same amount as impulses
+        model = pk.Model(1, model_args, 'iv', pk.Bolus([5], [10], sigma = 0.5))
+        amounts = []
+        for impulse_doses in [False, True]:
+            solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-10,
+                                   atol = 1e-12, max_step = 0.1,
+                                   impulse_doses = impulse_doses)
+            amounts.append(solution._solve_models()[0].y[0, 80])
+        # Up to the spread of the Gaussian, exp(sigma^2 k^2 / 2) - 1 ~ 3%
+        np.testing.assert_allclose(amounts[0], amounts[1], rtol = 5e-2)
+
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0]], batch = True,
+                        impulse_doses = True)
+
+    def test_stop_conditions(self):
+        """
+        Test that integration stops at washout and plateau conditions.
+        """
+        model_args = {'name': 'test_model', 'V_c': 2.0, 'CL': 1.0}
+        t_eval = np.linspace(0, 20, 201)
+
+        # Concentration 5*exp(-t/2) falls below 0.5 at t = 2*ln(10)
+        t_stop = 2 * np.log(10)
+        for engine in ['list', 'expm']:
+            model = pk.Model(1, model_args, 'iv', 0.0)
+            solution = pk.Solution([model], t_eval, [[10]], engine = engine,
+                                   rtol = 1e-10, atol = 1e-12,
+                                   stop_conditions = [pk.BelowThreshold(0.5)])
+            sol = solution._integrate(model, model.make_args(),
+                                      np.array([10.0]))
+            self.assertTrue(sol.success)
+            self.assertAlmostEqual(sol.stop_time, t_stop, places = 3)
+            self.assertEqual(sol.stop_reason, 'concentration below 0.5')
+            np.testing.assert_allclose(sol.t, t_eval[t_eval < t_stop])
+            self.assertEqual(sol.y.shape, (1, len(sol.t)))
+
+        # An infusion plateaus at q = 2, with relative change below 0.01
+        # from t = 2*ln(51)
+        model = pk.Model(1, model_args, 'iv', 1.0)
+        solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-10,
+                               atol = 1e-12,
+                               stop_conditions = [pk.BelowThreshold(0.1),
+                                                  pk.Plateau(0.01)])
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        self.assertAlmostEqual(sol.stop_time, 2 * np.log(51), places = 5)
+        self.assertEqual(sol.stop_reason, 'relative change below 0.01')
+
+        # The peak after a single bolus is not a plateau, for any engine
+        sc_args = {'name': 'sc_model', 'V_c': 1.0, 'Q_p1': 1.0, 'V_p1': 2.0,
+                   'CL': 0.5, 'k_a': 0.5}
+        for engine in ['list', 'expm']:
+            sc_model = pk.Model(3, sc_args, 'sc', pk.Bolus([1], [20], 0.5))
+            solution = pk.Solution([sc_model], np.linspace(0, 20, 201),
+                                   [[0, 0, 0]], engine = engine,
+                                   stop_conditions = [pk.Plateau(1e-2)])
+            sol = solution._solve_models()[0]
+            self.assertIsNone(sol.stop_time)
+            self.assertGreater(np.argmax(sol.y[1]), 0)
+
+        # A constant dose reaches steady state in every compartment, where
+        # both engines stop
+        stops = []
+        for engine in ['list', 'expm']:
+            sc_model = pk.Model(3, sc_args, 'sc', 1.0)
+            solution = pk.Solution([sc_model], np.linspace(0, 100, 2001),
+                                   [[0, 0, 0]], engine = engine, rtol = 1e-8,
+                                   atol = 1e-10,
+                                   stop_conditions = [pk.Plateau(1e-2)])
+            stops.append(solution._solve_models()[0].stop_time)
+        self.assertIsNotNone(stops[0])
+        self.assertAlmostEqual(stops[0], stops[1], delta = 0.1)
+
+        # Conditions not reached
+        solution = pk.Solution([model], t_eval, [[0]],
+                               stop_conditions = [pk.BelowThreshold(0.1)])
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        self.assertIsNone(sol.stop_time)
+        self.assertIsNone(sol.stop_reason)
+        np.testing.assert_allclose(sol.t, t_eval)
+
+        # Washout after the last of several impulse doses
+        regimen = pk.RepeatedBolus(10.0, tau = 4, count = 3)
+        model = pk.Model(1, model_args, 'iv', regimen)
+        solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-10,
+                               atol = 1e-12, impulse_doses = True,
+                               stop_conditions = [pk.BelowThreshold(0.5)])
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        q_last = 10.0 * (1 + np.exp(-2) + np.exp(-4))
+        self.assertAlmostEqual(sol.stop_time, 8 + 2 * np.log(q_last),
+                               places = 5)
+        self.assertEqual(sol.t[-1], t_eval[t_eval < sol.stop_time][-1])
 
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0]], batch = True,
+                        stop_conditions = [pk.Plateau(0.01)])
+
+    def test_stats(self):
+        """
+        Test the solver statistics of each model and their report.
+        """
+        t_eval = np.linspace(0, 1, 11)
+        models = [pk.Model(1, {'name': 'slow', 'V_c': 1.0, 'CL': 1000.0},
+                           'iv', 1.0),
+                  pk.Model(1, {'name': 'fast', 'V_c': 1.0, 'CL': 1.0},
+                           'iv', 1.0)]
+        seen = []
+        solution = pk.Solution(models, t_eval, [[0], [0]],
+                               sink = pk.NullSink(), count_steps = True,
+                               callback = lambda model, stats:
+                               seen.append((model, stats)))
+        sol_list = solution.analyse_models()
+
+        self.assertEqual([stats.name for stats in solution.stats],
+                         ['slow', 'fast'])
+        self.assertEqual([model for model, stats in seen], models)
+        for sol, stats in zip(sol_list, solution.stats):
+            self.assertIs(sol.stats, stats)
+            self.assertEqual(stats.method, 'RK45')
+            self.assertEqual(stats.nfev, sol.nfev)
+            self.assertGreaterEqual(stats.wall_time, 0)
+            self.assertTrue(stats.success)
+
+        # The stiff model takes many more steps
+        slow, fast = solution.stats
+        self.assertGreater(slow.nsteps, 10 * fast.nsteps)
+
+        report = solution.report()
+        self.assertEqual(report.models, 2)
+        self.assertEqual(report.failed, 0)
+        self.assertEqual(report.nfev, slow.nfev + fast.nfev)
+        self.assertEqual(report.nsteps, slow.nsteps + fast.nsteps)
+
+        # Counted steps are the steps kept by dense output
+        for method in ['RK45', 'BDF']:
+            counted = pk.Solution(models, t_eval, [[0], [0]], method = method,
+                                  count_steps = True)
+            counted._solve_models()
+            dense = pk.Solution(models, t_eval, [[0], [0]], method = method,
+                                dense_output = True)
+            sol_list = dense._solve_models()
+            for stats, sol in zip(counted.stats, sol_list):
+                self.assertEqual(stats.nsteps, len(sol.t) - 1)
+
+        # Steps are not counted unless requested
+        solution = pk.Solution(models, t_eval, [[0], [0]])
+        solution._solve_models()
+        self.assertIsNone(solution.stats[0].nsteps)
+        self.assertEqual(solution.report().nsteps, 0)
+
+        # Models of a batch share the stats of their stack
+        solution = pk.Solution(models, t_eval, [[0], [0]], batch = True)
+        solution._solve_models()
+        self.assertEqual([stats.stack_size for stats in solution.stats],
+                         [2, 2])
+        self.assertEqual(solution.stats[0].nfev, solution.stats[1].nfev)
+
+        solution = pk.Solution(models, t_eval, [[0], [0]], engine = 'expm')
+        solution._solve_models()
+        self.assertIsNone(solution.stats[0].method)
+        self.assertEqual(solution.stats[0].nsteps, 10)
+
+    def test_dense_output(self):
+        """
+        Test sampling solutions computed with dense output at arbitrary
+        times.
+        """
+        model_args = {'name': 'test_model', 'V_c': 2.0, 'CL': 1.0}
+        t_eval = np.linspace(0, 10, 1001)
+        times = np.array([0.25, 1.0, 3.3333, 7.5, 10.0])
+
+        # Infusion of rate 1 from no drug: q = 2*(1 - exp(-t/2))
+        y_sol = 2 * (1 - np.exp(-times / 2))
+        for engine in ['list', 'expm']:
+            model = pk.Model(1, model_args, 'iv', 1.0)
+            solution = pk.Solution([model], t_eval, [[0]], engine = engine,
+                                   rtol = 1e-10, atol = 1e-12,
+                                   dense_output = True, sink = pk.NullSink())
+            sol_list = solution.analyse_models()
+            samples = solution.sample(sol_list, times)
+            np.testing.assert_allclose(samples[0][0], y_sol, rtol = 1e-8)
+            np.testing.assert_allclose(sol_list[0].sol(3.3333),
+                                       [y_sol[2]], rtol = 1e-8)
+            if engine == 'list':
+                # Only the steps of the solver are kept
+                self.assertLess(len(sol_list[0].t), len(t_eval) // 5)
+
+        # Batched models
+        models = [pk.Model(1, model_args, 'iv', 1.0),
+                  pk.Model(1, dict(model_args, CL = 2.0), 'iv', 1.0)]
+        solution = pk.Solution(models, t_eval, [[0], [0]], rtol = 1e-10,
+                               atol = 1e-12, batch = True,
+                               dense_output = True)
+        samples = solution.sample(solution._solve_models(), times)
+        np.testing.assert_allclose(samples[0][0], y_sol, rtol = 1e-8)
+        np.testing.assert_allclose(samples[1][0], 1 - np.exp(-times),
+                                   rtol = 1e-8)
+
+        # Impulse doses are right-continuous
+        regimen = pk.RepeatedBolus(5.0, tau = 2.5, count = 4)
+        model = pk.Model(1, model_args, 'iv', regimen)
+        solution = pk.Solution([model], t_eval, [[0]], rtol = 1e-10,
+                               atol = 1e-12, impulse_doses = True,
+                               dense_output = True)
+        sol = solution._integrate(model, model.make_args(), np.zeros(1))
+        y_bolus = sum(np.where(times >= T, 5.0 * np.exp(-(times - T) / 2), 0)
+                      for T in 2.5 * np.arange(4))
+        np.testing.assert_allclose(sol.sol(times)[0], y_bolus, rtol = 1e-8)
+        self.assertAlmostEqual(sol.sol(2.5)[0], 5.0 * (1 + np.exp(-1.25)))
+
+        solution = pk.Solution([model], t_eval, [[0]])
+        with self.assertRaises(ValueError):
+            solution.sample(solution._solve_models(), times)
+
+    def test_incremental(self):
+        """
+        Test that edited doses and extended time points are solved from
+        the last unaffected checkpoint.
+        """
+        model_args = {'name': 'test_model', 'V_c': 1.0, 'Q_p1': 2.0,
+                      'V_p1': 3.0, 'CL': 4.0}
+        t_eval = np.linspace(0, 10, 101)
+        dose = np.where(t_eval < 1, 2.0, 0.0)
+
+        def solve(solution):
+            return solution._solve_models()[0]
+
+        model = pk.Model(2, model_args, 'iv', dose, dose_grid = t_eval)
+        solution = pk.Solution([model], t_eval, [[0, 0]], rtol = 1e-10,
+                               atol = 1e-12, incremental = True)
+        first = solve(solution)
+        self.assertIsNone(first.stats.resumed_at)
 
+        # A later dose, from the grid point at t = 6
+        late = dose.copy()
+        late[60:70] = 1.0
+        solution.models = [pk.Model(2, model_args, 'iv', late,
+                                    dose_grid = t_eval)]
+        resumed = solve(solution)
+        self.assertAlmostEqual(resumed.stats.resumed_at, 5.9)
+        self.assertLess(resumed.nfev, first.nfev)
+        np.testing.assert_array_equal(resumed.y[:, :59], first.y[:, :59])
 
+        full = pk.Solution([pk.Model(2, model_args, 'iv', late,
+                                     dose_grid = t_eval)],
+                           t_eval, [[0, 0]], rtol = 1e-10, atol = 1e-12)
+        np.testing.assert_allclose(resumed.y, solve(full).y, rtol = 1e-7,
+                                   atol = 1e-9)
+        np.testing.assert_allclose(resumed.t, t_eval)
+
+        # Extending t_end resumes from the previous end
+        long_eval = np.linspace(0, 20, 201)
+        long_dose = np.concatenate([late, np.zeros(100)])
+        solution.models = [pk.Model(2, model_args, 'iv', long_dose,
+                                    dose_grid = long_eval)]
+        solution.t_eval = long_eval
+        extended = solve(solution)
+        self.assertAlmostEqual(extended.stats.resumed_at, 10.0)
+        np.testing.assert_allclose(extended.t, long_eval)
+        np.testing.assert_array_equal(extended.y[:, :101], resumed.y)
+
+        # Other parameters are solved from the start
+        solution.models = [pk.Model(2, dict(model_args, CL = 1.0), 'iv',
+                                    long_dose, dose_grid = long_eval)]
+        self.assertIsNone(solve(solution).stats.resumed_at)
+
+        # A bolus added to a regimen of impulse doses
+        model_args = {'name': 'bolus_model', 'V_c': 2.0, 'CL': 1.0}
+        solution = pk.Solution(
+            [pk.Model(1, model_args, 'iv',
+                      pk.RepeatedBolus(5.0, tau = 2.5, count = 2))],
+            t_eval, [[0]], rtol = 1e-10, atol = 1e-12, impulse_doses = True,
+            incremental = True)
+        solve(solution)
+        solution.models = [pk.Model(1, model_args, 'iv',
+                                    pk.RepeatedBolus(5.0, tau = 2.5,
+                                                     count = 3))]
+        sol = solve(solution)
+        self.assertAlmostEqual(sol.stats.resumed_at, 4.9)
+        y_sol = sum(np.where(t_eval >= T, 5.0 * np.exp(-(t_eval - T) / 2), 0)
+                    for T in [0.0, 2.5, 5.0])
+        np.testing.assert_allclose(sol.y[0], y_sol, rtol = 1e-7)
+
+        # Solving an unchanged model again returns the checkpoint
+        for dose in [1.0, np.linspace(0, 1, 101)]:
+            model = pk.Model(1, model_args, 'iv', dose, dose_grid = t_eval)
+            solution = pk.Solution([model], t_eval, [[0]], incremental = True,
+                                   sink = pk.NullSink())
+            first = solution.analyse_models()[0]
+            again = solution.analyse_models()[0]
+            self.assertEqual(again.stats.resumed_at, 10.0)
+            self.assertEqual(again.nfev, 0)
+            np.testing.assert_array_equal(again.y, first.y)
+            np.testing.assert_array_equal(again.t, first.t)
+
+        # An edit of a regimen between time points is detected
+        t_eval = np.linspace(0, 48, 9)
+        model_args = {'name': 'infusion_model', 'V_c': 2.0, 'CL': 0.1}
+        solution = pk.Solution(
+            [pk.Model(1, model_args, 'iv', pk.Infusion([20], [22], [5]))],
+            t_eval, [[0]], rtol = 1e-10, atol = 1e-12, max_step = 0.5,
+            incremental = True)
+        solve(solution)
+        edited = pk.Model(1, model_args, 'iv', pk.Infusion([20], [22], [50]))
+        solution.models = [edited]
+        resumed = solve(solution)
+        self.assertEqual(resumed.stats.resumed_at, 18.0)
+        full = pk.Solution([edited], t_eval, [[0]], rtol = 1e-10,
+                           atol = 1e-12, max_step = 0.5)
+        np.testing.assert_allclose(resumed.y, solve(full).y, rtol = 1e-6)
+
+        # Doses given by other callables are solved from the start
+        solution.models = [pk.Model(1, model_args, 'iv', lambda t: 1.0)]
+        solve(solution)
+        self.assertIsNone(solve(solution).stats.resumed_at)
+
+    def test_sensitivities(self):
+        """
+        Test forward sensitivities against finite differences.
+        """
+        model_args = {'name': 'test_model', 'V_c': 1.0, 'Q_p1': 2.0,
+                      'V_p1': 3.0, 'CL': 4.0, 'k_a': 5.0}
+        t_eval = np.linspace(0, 2, 41)
+        dose = pk.Infusion(starts = [0.5], ends = [1.5], rates = [2.0])
+
+        def solve(model_args, engine, sensitivities = False):
+            model = pk.Model(3, model_args, 'sc', dose)
+            solution = pk.Solution([model], t_eval, [[1, 0, 0]],
+                                   engine = engine, rtol = 1e-10,
+                                   atol = 1e-12,
+                                   sensitivities = sensitivities)
+            return solution._solve_models()[0]
+
+        # The 'expm' engine is exact, the finite differences of the 'list'
+        # engine are limited by its tolerances
+        for engine, eps, rtol, atol in [('list', 1e-3, 1e-4, 1e-5),
+                                        ('expm', 1e-5, 1e-6, 1e-9)]:
+            sol = solve(model_args, engine, sensitivities = True)
+            self.assertEqual(sol.parameters,
+                             ['k_a', 'V_c', 'V_p1', 'Q_p1', 'CL'])
+            self.assertEqual(sol.sensitivities.shape, (5, 3, 41))
+            np.testing.assert_allclose(sol.y, solve(model_args, engine).y,
+                                       rtol = 1e-6, atol = 1e-9)
+
+            for j, name in enumerate(sol.parameters):
+                plus = solve(dict(model_args, **{name: model_args[name]
+                                                 + eps}), engine)
+                minus = solve(dict(model_args, **{name: model_args[name]
+                                                  - eps}), engine)
+                np.testing.assert_allclose(sol.sensitivities[j],
+                                           (plus.y - minus.y) / (2 * eps),
+                                           rtol = rtol, atol = atol)
+
+        with self.assertRaises(ValueError):
+            pk.Solution([], t_eval, [], batch = True, sensitivities = True)
+
+    def test_compact_output(self):
+        """
+        Test that solutions keep only the selected compartments and time
+        points, in single precision, and that the reduction is reported.
+        """
+        model_args = {'name': 'test_model', 'V_c': 1.0, 'Q_p1': 2.0,
+                      'V_p1': 3.0, 'Q_p2': 0.5, 'V_p2': 6.0, 'CL': 4.0}
+        model = pk.Model(3, model_args, 'iv', 1.0)
+        t_eval = np.linspace(0, 10, 1001)
+        full = pk.Solution([model], t_eval, [[0, 0, 0]])._solve_models()[0]
+
+        for batch in [False, True]:
+            solution = pk.Solution([model], t_eval, [[0, 0, 0]],
+                                   compartments = [0], dtype = 'float32',
+                                   decimate = 4, batch = batch)
+            sol = solution._solve_models()[0]
+            self.assertEqual(sol.y.shape, (1, 251))
+            self.assertEqual(sol.y.dtype, np.float32)
+            self.assertEqual(sol.compartments, [0])
+            np.testing.assert_array_equal(sol.t, t_eval[::4])
+            np.testing.assert_allclose(sol.y[0], full.y[0, ::4], rtol = 1e-6)
+            self.assertEqual(sol.stats.full_nbytes, t_eval.nbytes * 4)
+            report = solution.report()
+            self.assertGreater(report.storage_reduction, 4)
+
+        # The last time point is always kept
+        solution = pk.Solution([model], t_eval, [[0, 0, 0]], decimate = 7)
+        sol = solution._solve_models()[0]
+        self.assertEqual(sol.t[-1], 10.0)
+        self.assertEqual(len(sol.t), 144)
+        self.assertEqual(solution.report().storage_reduction,
+                         1001 / 144)
+
+        # Dense output of the kept compartments
+        solution = pk.Solution([model], t_eval, [[0, 0, 0]],
+                               compartments = [2, 0], dtype = 'float32',
+                               dense_output = True)
+        sol = solution._solve_models()[0]
+        self.assertEqual(sol.sol(5.0).shape, (2,))
+        self.assertEqual(sol.sol(5.0).dtype, np.float32)
+
+        # Binary output in single precision
+        with tempfile.TemporaryDirectory() as directory:
+            solution = pk.Solution([model], t_eval, [[0, 0, 0]],
+                                   compartments = [0, 2], dtype = 'float32',
+                                   output_format = 'binary',
+                                   sink = pk.FileSink(directory, 'binary'))
+            sol = solution.analyse_models()[0]
+            time, columns, metadata = pk.read_columnar(
+                os.path.join(directory, 'test_model'))
+            self.assertEqual(metadata['compartments'], ['q_c', 'q_p2'])
+            self.assertEqual(columns[1].dtype, np.float32)
+            np.testing.assert_array_equal(columns[1], sol.y[1])
+
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0, 0, 0]], compartments = [3])
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0, 0, 0]], dtype = int)
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0, 0, 0]], decimate = 0)
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pkmodel as pk
+
+
+class StorageTest(unittest.TestCase):
+    """
+    Tests the binary columnar storage of solutions.
+    """
+
+    def test_write_and_read(self):
+        """
+        Tests writing a solution in chunks and reading it back.
+        """
+        t = np.linspace(0, 1, 10)
+        y = np.vstack([t, 2 * t, 3 * t])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model')
+            metadata = {'dose_type': 'sc', 'model_args': {'CL': np.float64(1)}}
+            with pk.ColumnarWriter(path, ['q_0', 'q_c', 'q_p1'],
+                                   metadata) as writer:
+                writer.append(t[:4], y[:, :4])
+                writer.append(t[4:], y[:, 4:])
+
+                # Rows must match the compartments and the time
+                with self.assertRaises(ValueError):
+                    writer.append(t, y[:2])
+
+            time, columns, meta = pk.read_columnar(path)
+            np.testing.assert_array_equal(time, t)
+            np.testing.assert_array_equal(np.vstack(columns), y)
+            self.assertIsInstance(time, np.memmap)
+            self.assertEqual(meta['compartments'], ['q_0', 'q_c', 'q_p1'])
+            self.assertEqual(meta['dose_type'], 'sc')
+            self.assertEqual(meta['model_args'], {'CL': 1.0})
+
+            # Release the memory maps before appending
+            del time, columns
+
+            # Append to the existing solution
+            with pk.ColumnarWriter(path, ['q_0', 'q_c', 'q_p1'],
+                                   mode='a') as writer:
+                writer.append(t + 1, y)
+            time, columns, meta = pk.read_columnar(path, mmap=False)
+            self.assertEqual(len(time), 20)
+            self.assertEqual(meta['dose_type'], 'sc')
+
+            with self.assertRaises(ValueError):
+                pk.ColumnarWriter(path, ['q_c'], mode='a')
+
+    def test_solution_binary_output(self):
+        """
+        Tests saving the solutions of analyse_models in binary format.
+        """
+        model_args = {'name': 'binary_model', 'V_c': 1.0, 'CL': 1.0,
+                      'k_a': 2.0}
+        model = pk.Model(2, model_args, 'sc', 1.0)
+        t_eval = np.linspace(0, 1, 10)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                solution = pk.Solution([model], t_eval, [[0, 0]],
+                                       output_format='binary')
+                sol = solution.analyse_models()[0]
+            finally:
+                os.chdir(cwd)
+
+            time, columns, meta = pk.read_columnar(
+                os.path.join(directory, 'binary_model'), mmap=False)
+            np.testing.assert_array_equal(time, sol.t)
+            np.testing.assert_array_equal(np.vstack(columns), sol.y)
+            self.assertEqual(meta['compartments'], ['q_0', 'q_c'])
+            self.assertEqual(meta['model_args'], model_args)
+
+        with self.assertRaises(ValueError):
+            pk.Solution([model], t_eval, [[0, 0]], output_format='hdf5')
+
+    def test_single_precision_csv(self):
+        """
+        Tests that single precision solutions are written to csv with
+        their shortest representation.
+        """
+        time = np.array([0.0, 0.5])
+        sol = np.array([[0.1, 0.2]], dtype=np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'solution.csv')
+            pk.storage.save_csv(time, sol, path)
+            with open(path) as f:
+                self.assertEqual(f.read().split(), ['0.0,0.1', '0.5,0.2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
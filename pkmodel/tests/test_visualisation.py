@@ -1,3 +1,5 @@
+import os
+import tempfile
 import pkmodel as pk
 import unittest
 from unittest.mock import patch
@@ -160,5 +162,74 @@ class VisualisationTest(unittest.TestCase):
                             save_file_path='/path/to/file.pdf')
             assert savefig_mock.called
 
+    @patch("pandas.read_csv")
+    def test_lazy_loading(self, read_csv_mock):
+        """
+        Tests that each file is parsed once, on first use only
+        """
+
+        test_array = np.array( [[1,2,3,4], [5,6,7,8]] )
+        read_csv_mock.return_value = pd.DataFrame( test_array )
+
+        plots = pk.Visualisation(['', ''],
+                                    ['beautiful model', 'fantastic model'],
+                                    ['sc', 'iv'])
+        self.assertEqual(read_csv_mock.call_count, 0)
+
+        with patch("matplotlib.pyplot.show"):
+            plots.visualise(['fantastic model'])
+        self.assertEqual(read_csv_mock.call_count, 1)
+
+    def test_cached_and_binary_loading(self):
+        """
+        Tests that unmodified files are loaded from the cache and that
+        binary solutions are memory mapped
+        """
+
+        test_array = np.array( [[1.,2.,3.], [5.,6.,7.]] )
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'model.csv')
+            np.savetxt(csv_path, test_array, delimiter=',')
+            binary_path = os.path.join(directory, 'model')
+            with pk.ColumnarWriter(binary_path, ['q_c', 'q_p1']) as writer:
+                writer.append(test_array[:, 0], test_array[:, 1:].T)
+
+            data_labels = ['csv model', 'binary model']
+            plots = pk.Visualisation([csv_path, binary_path], data_labels,
+                                     ['iv', 'iv'])
+            for label in data_labels:
+                np.testing.assert_array_equal(plots._time[label],
+                                              test_array[:, 0])
+                np.testing.assert_array_equal(plots._quantity[label],
+                                              test_array[:, 1:])
+            self.assertIsInstance(plots._time['binary model'], np.memmap)
+
+            with patch("pandas.read_csv") as read_csv_mock:
+                plots = pk.Visualisation([csv_path], ['csv model'], ['iv'])
+                np.testing.assert_array_equal(plots._time['csv model'],
+                                              test_array[:, 0])
+                self.assertFalse(read_csv_mock.called)
+
+            # Appending to a binary solution loads it again
+            del plots
+            with pk.ColumnarWriter(binary_path, ['q_c', 'q_p1'],
+                                   mode='a') as writer:
+                writer.append(test_array[:, 0] + 10, test_array[:, 1:].T)
+            plots = pk.Visualisation([binary_path], ['binary model'], ['iv'])
+            self.assertEqual(len(plots._time['binary model']), 4)
+
+            # Only the most recently used solutions are kept
+            for i in range(pk.visualisation._CACHE_SIZE + 1):
+                path = os.path.join(directory, 'model%d.csv' %i)
+                np.savetxt(path, test_array, delimiter=',')
+                pk.visualisation._load(path)
+            self.assertEqual(len(pk.visualisation._cache),
+                             pk.visualisation._CACHE_SIZE)
+            self.assertNotIn(binary_path, pk.visualisation._cache)
+
+            # Release the memory maps before the files are removed
+            del plots
+            pk.visualisation._cache.clear()
+
 if __name__ == '__main__':
     unittest.main()
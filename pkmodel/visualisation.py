@@ -4,11 +4,79 @@
 
 # Packages
 
+import collections
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd 
 
-from matplotlib import cm 
+from .storage import is_columnar, read_columnar
+
+# Solution data loaded by any Visualisation, keyed by file path, with the
+# stamp of the files it was loaded from so that modified files are loaded
+# again. Only the most recently used solutions are kept, which bounds the
+# memory maps and file handles held open
+_cache = collections.OrderedDict()
+_CACHE_SIZE = 16
+
+
+def _stamp(file_path):
+    # Modification time and size of a solution file, or of every file of a
+    # binary solution directory, since appending to a binary solution
+    # changes its files but not its directory
+    if os.path.isdir(file_path):
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns,
+                             entry.stat().st_size)
+                            for entry in os.scandir(file_path)))
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _load(file_path):
+    # Loads the time steps and quantities of a solution data file
+    try:
+        key = os.fspath(file_path)
+        stamp = _stamp(file_path)
+    except (OSError, TypeError):
+        key = None
+
+    if key in _cache:
+        cached_stamp, data = _cache[key]
+        if cached_stamp == stamp:
+            _cache.move_to_end(key)
+            return data
+        del _cache[key]
+
+    if key is not None and is_columnar(file_path):
+        # Binary solutions are memory mapped rather than parsed
+        time, columns, metadata = read_columnar(file_path)
+        data = (time, None, columns)
+    else:
+        # Each .csv file is parsed once for both time and quantities
+        values = pd.read_csv(file_path, sep=',', header=None).to_numpy()
+        quantity = values[:, 1:]
+        data = (values[:, 0], quantity,
+                [quantity[:, j] for j in range(quantity.shape[1])])
+
+    if key is not None:
+        _cache[key] = (stamp, data)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+
+class _LazyDict(dict):
+    # A dict computing the value of a missing key on first access
+    def __init__(self, compute):
+        super().__init__()
+        self._compute = compute
+
+    def __missing__(self, key):
+        value = self._compute(key)
+        self[key] = value
+        return value
+
 
 #Class
 
@@ -25,7 +93,9 @@ class Visualisation:
         file, where the first column is the time steps and second column 
         is the quantity at each time step. The output .csv file generated 
         from the _save_to_csv method of the Solution class is of the 
-        correct format.
+        correct format. Binary solutions saved by the _save_to_binary method
+        are memory mapped instead. Files are loaded on first use, and
+        files loaded before and not modified since are not loaded again.
 
 
         e.g. ['../path/to/beautiful_model_data.csv',
@@ -55,7 +125,7 @@ class Visualisation:
 
     .plot_labels: a dict with str values
         A dictionary of plot labels for each quantity in each data file, 
-        automatically generated after the class initialisation. The keywords
+        automatically generated on first use of each data file. The keywords
         are the data_file_labels provided during the initialisation.
 
     """
@@ -77,37 +147,44 @@ class Visualisation:
                                 "Elements must be 'sc' or 'iv'.") )
         
         self._data_labels = data_labels
-        self._time = {}
-        self._quantity = {} 
-        self._compartment_num = {}
-        self.plot_labels = {}
-
-        for i, file_path in enumerate(data_file_paths):
-            label = self._data_labels[i]
-
-            self._time[label] = pd.read_csv(file_path, sep=',', 
-                                                header=None
-                                                ).loc[:, 0].to_numpy()
-            self._quantity[label] = pd.read_csv(file_path, sep=',', 
-                                                    header=None
-                                                    ).loc[:, 1:].to_numpy()
-            self._compartment_num[label] = np.shape(self._quantity[label])[1]
-            self.plot_labels[label] = [None] * self._compartment_num[label]
-
-            if dose_types[i] == 'sc':
-                self.plot_labels[label][0] = label + ' $q_0$'
-                self.plot_labels[label][1] = label + ' $q_c$'
-                self.plot_labels[label][2:] = [label + ' $q_{p%d}$' %(i)
-                                                for i in range(1, 
-                                                self._compartment_num[label] 
-                                                - 1) ]
-
-            elif dose_types[i] == 'iv':
-                self.plot_labels[label][0] = label + ' $q_c$'
-                self.plot_labels[label][1:] = [label + ' $q_{p%d}$' %(i)
-                                                for i in range(1, 
-                                                self._compartment_num[label]
-                                                ) ]
+        self._file_paths = dict(zip(data_labels, data_file_paths))
+        self._dose_types = dict(zip(data_labels, dose_types))
+        self._data = _LazyDict(lambda label: _load(self._file_paths[label]))
+        self._time = _LazyDict(lambda label: self._data[label][0])
+        self._quantity = _LazyDict(self._load_quantity)
+        self._compartment_num = _LazyDict(
+            lambda label: len(self._data[label][2]))
+        self.plot_labels = _LazyDict(self._make_plot_labels)
+
+
+    def _load_quantity(self, label):
+        # Quantities of a data file with one column per compartment
+        time, quantity, columns = self._data[label]
+        if quantity is None:
+            quantity = np.column_stack(columns)
+        return quantity
+
+
+    def _make_plot_labels(self, label):
+        # Plot labels of each compartment of a data file
+        plot_labels = [None] * self._compartment_num[label]
+
+        if self._dose_types[label] == 'sc':
+            plot_labels[0] = label + ' $q_0$'
+            plot_labels[1] = label + ' $q_c$'
+            plot_labels[2:] = [label + ' $q_{p%d}$' %(i)
+                                for i in range(1, 
+                                self._compartment_num[label] 
+                                - 1) ]
+
+        elif self._dose_types[label] == 'iv':
+            plot_labels[0] = label + ' $q_c$'
+            plot_labels[1:] = [label + ' $q_{p%d}$' %(i)
+                                for i in range(1, 
+                                self._compartment_num[label]
+                                ) ]
+
+        return plot_labels
 
 
     def visualise(self, labels_of_data_to_visualise, save_file_path=None):
@@ -144,7 +221,7 @@ class Visualisation:
         # Colour map for the figure
         # A perceptually uniform colour map suitable for the most common
         # types of colour-blindness
-        cmap = cm.get_cmap('viridis')
+        cmap = plt.get_cmap('viridis')
 
         ### Figure ###
         fig, ax = plt.subplots(1, 1)
@@ -167,8 +244,10 @@ class Visualisation:
         for i, label in enumerate(labels_of_data_to_visualise):
             N = self._compartment_num[label]
 
+            columns = self._data[label][2]
+
             for j in range(N):
-                ax.plot( self._time[label], self._quantity[label][:, j], 
+                ax.plot( self._time[label], columns[j], 
                     color=cmap((i * N + j) * 0.9 / width(L * N) ), 
                     label=self.plot_labels[label][j] )
 
@@ -61,6 +61,9 @@ setup(
     # Packages to include
     packages=find_packages(include=('pkmodel', 'pkmodel.*')),
 
+    # Module __getattr__ (PEP 562) is needed for lazy imports
+    python_requires='>=3.7',
+
     # List of dependencies
     install_requires=[
         # Dependencies go here!